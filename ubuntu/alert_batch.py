@@ -0,0 +1,100 @@
+# Built-in modules
+import threading
+import time
+
+
+class AlertBatcher:
+    """Kumpulkan event yang datang berdekatan menjadi satu digest per host.
+
+    Batch dikirim ke ``flush(host, events)`` setelah ``max_delay`` detik sejak
+    event pertama, atau langsung ketika jumlahnya mencapai ``max_batch``.
+    Event dengan key yang sama (mis. ID_SERIAL + action) dalam satu batch dibuang.
+    """
+
+    def __init__(self, flush, max_delay=2.0, max_batch=50, loop=None):
+        self.flush = flush
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        # Jika loop asyncio diberikan, deadline memakai loop.call_later, tanpa thread
+        self.loop = loop
+
+        self.pending = {}    # host -> [event, ...]
+        self.keys = {}       # host -> set(key)
+        self.deadlines = {}  # host -> monotonic deadline
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None and self.loop is None:
+            self.thread = threading.Thread(target=self._run, name="alert-batcher", daemon=True)
+            self.thread.start()
+        return self
+
+    def add(self, host, key, event):
+        """Tambahkan event; return False jika event duplikat dan dibuang."""
+        ready = None
+        with self.cond:
+            keys = self.keys.setdefault(host, set())
+            if key in keys:
+                return False
+            keys.add(key)
+            events = self.pending.setdefault(host, [])
+            events.append(event)
+
+            if len(events) >= self.max_batch:
+                ready = self._take(host)
+            elif host not in self.deadlines:
+                self.deadlines[host] = time.monotonic() + self.max_delay
+                if self.loop is not None:
+                    self.loop.call_later(self.max_delay, self._flush_due)
+                else:
+                    self.cond.notify()
+
+        if ready:
+            self.flush(host, ready)
+        return True
+
+    def flush_all(self):
+        """Kirim semua batch yang masih tertunda (dipakai saat shutdown)."""
+        with self.cond:
+            batches = [(host, self._take(host)) for host in list(self.pending)]
+        for host, events in batches:
+            self.flush(host, events)
+
+    def _take(self, host):
+        self.keys.pop(host, None)
+        self.deadlines.pop(host, None)
+        return self.pending.pop(host, [])
+
+    def _due_batches(self, now):
+        due = [host for host, deadline in self.deadlines.items() if deadline <= now]
+        return [(host, self._take(host)) for host in due]
+
+    def _flush_batches(self, batches):
+        for host, events in batches:
+            try:
+                self.flush(host, events)
+            except Exception as e:
+                print(f"Error flushing alert batch for {host}: {e}")
+
+    def _flush_due(self):
+        with self.cond:
+            now = time.monotonic()
+            batches = self._due_batches(now)
+            if not batches and self.deadlines:
+                # Timer loop bisa terpicu sedikit lebih awal dari deadline
+                self.loop.call_later(min(self.deadlines.values()) - now, self._flush_due)
+        self._flush_batches(batches)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.deadlines:
+                    self.cond.wait()
+                now = time.monotonic()
+                batches = self._due_batches(now)
+                if not batches:
+                    self.cond.wait(min(self.deadlines.values()) - now)
+                    continue
+
+            self._flush_batches(batches)
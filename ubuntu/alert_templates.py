@@ -0,0 +1,160 @@
+# Built-in modules
+import html
+from string import Template
+
+# Layout di-parse sekali saat modul dimuat; render hanya substitusi nilai yang sudah di-escape
+TABLE_OPEN = ('<table border="1" cellpadding="6" cellspacing="0" '
+              'style="border-collapse: collapse; font-family: Arial, sans-serif; font-size: 14px;">\n')
+TABLE_CLOSE = "</table>\n"
+HEADER_ROW_OPEN = '<tr style="background-color: #f2f2f2;">'
+HEADER_CELL = Template('<th align="left">$label</th>')
+ROW = Template("<tr>$cells</tr>\n")
+CELL = Template("<td>$value</td>")
+
+USB_INTRO = Template("<p>USB detected at <strong>$waktu</strong> by user: <strong>$user</strong></p>\n")
+IP_INTRO = Template("<p><strong>[ALERT]</strong> Unauthorized IP detected at <strong>$waktu</strong> "
+                    "by user: <strong>$user</strong></p>\n")
+# Satu hitungan untuk dua sebab: rate limit dan debounce perangkat yang dicolok ulang
+SUPPRESSED_NOTE = Template("<p><em>$count earlier alerts were suppressed "
+                           "(rate limit or device re-attached within the debounce window).</em></p>\n")
+DIGEST_INTRO = Template("<p>$count USB devices detected between <strong>$first</strong> and "
+                        "<strong>$last</strong> by user: <strong>$user</strong></p>\n")
+
+# (label, key event)
+USB_FIELDS = (
+    ("Name", "name"),
+    ("Manufacturer", "manufacturer"),
+    ("Serial", "serial"),
+    ("Vendor ID", "vendor_id"),
+    ("Product ID", "model_id"),
+    ("USB Attach Event", "subsystem"),
+    ("Action", "action"),
+    ("Hostname", "hostname"),
+    ("IP Address", "ip"),
+    ("MAC Address", "mac"),
+    ("OS", "os"),
+)
+HOST_FIELDS = (
+    ("Hostname", "hostname"),
+    ("IP Address", "ip"),
+    ("MAC Address", "mac"),
+    ("OS", "os"),
+)
+IP_FIELDS = (
+    ("Hostname", "hostname"),
+    ("IP Address", "ip"),
+    ("Interface", "interface"),
+    ("Link", "link"),
+    ("Unauthorized addresses", "violations"),
+    ("MAC Address", "mac"),
+    ("OS", "os"),
+)
+DIGEST_COLUMNS = (
+    ("Time", "waktu"),
+    ("Name", "name"),
+    ("Manufacturer", "manufacturer"),
+    ("Serial", "serial"),
+    ("USB Attach Event", "subsystem"),
+    ("Action", "action"),
+)
+
+
+def _plain(value):
+    return "Unknown" if value is None else str(value)
+
+
+def _esc(value):
+    return html.escape(_plain(value))
+
+
+def _intro(template, values):
+    return template.substitute({key: _esc(value) for key, value in values.items()})
+
+
+def _header(labels):
+    return HEADER_ROW_OPEN + "".join(HEADER_CELL.substitute(label=_esc(l)) for l in labels) + "</tr>\n"
+
+
+def _row(values):
+    return ROW.substitute(cells="".join(CELL.substitute(value=_esc(v)) for v in values))
+
+
+def _suppressed_text(suppressed):
+    if not suppressed:
+        return ""
+    return (f"{suppressed} earlier alerts were suppressed "
+            "(rate limit or device re-attached within the debounce window).\n\n")
+
+
+def iter_field_table(event, fields):
+    yield TABLE_OPEN
+    yield _header(("Field", "Value"))
+    for label, key in fields:
+        yield _row((label, event.get(key)))
+    yield TABLE_CLOSE
+
+
+def _text_fields(event, fields):
+    width = max(len(label) for label, _ in fields)
+    return "".join(f"{label.ljust(width)} : {_plain(event.get(key))}\n" for label, key in fields)
+
+
+def iter_field_alert(intro, event, fields, suppressed=0):
+    yield "<html>\n<body>\n"
+    yield _intro(intro, {"waktu": event.get("waktu"), "user": event.get("user")})
+    if suppressed:
+        yield SUPPRESSED_NOTE.substitute(count=suppressed)
+    yield from iter_field_table(event, fields)
+    yield "</body>\n</html>\n"
+
+
+def usb_alert(event, suppressed=0):
+    """Return ``(text, html)`` untuk satu perangkat USB."""
+    text = (f"USB detected at {event.get('waktu')} by user: {event.get('user')}\n\n"
+            + _suppressed_text(suppressed) + _text_fields(event, USB_FIELDS))
+    return text, "".join(iter_field_alert(USB_INTRO, event, USB_FIELDS, suppressed))
+
+
+def ip_alert(event, suppressed=0):
+    """Return ``(text, html)`` untuk alert IP tidak sah."""
+    text = (f"[ALERT] Unauthorized IP detected at {event.get('waktu')} by user: {event.get('user')}\n\n"
+            + _suppressed_text(suppressed) + _text_fields(event, IP_FIELDS))
+    return text, "".join(iter_field_alert(IP_INTRO, event, IP_FIELDS, suppressed))
+
+
+def iter_digest_html(events, suppressed=0):
+    """Render digest beberapa event sebagai potongan-potongan string (stream)."""
+    first, last = events[0], events[-1]
+    yield "<html>\n<body>\n"
+    yield _intro(DIGEST_INTRO, {"count": len(events), "first": first.get("waktu"),
+                                "last": last.get("waktu"), "user": first.get("user")})
+    if suppressed:
+        yield SUPPRESSED_NOTE.substitute(count=suppressed)
+    yield TABLE_OPEN
+    yield _header(label for label, _ in DIGEST_COLUMNS)
+    for event in events:
+        yield _row(event.get(key) for _, key in DIGEST_COLUMNS)
+    yield TABLE_CLOSE
+    yield "<br>\n"
+    yield TABLE_OPEN
+    for label, key in HOST_FIELDS:
+        yield _row((label, first.get(key)))
+    yield TABLE_CLOSE
+    yield "</body>\n</html>\n"
+
+
+def iter_digest_text(events, suppressed=0):
+    first = events[0]
+    yield (f"{len(events)} USB devices detected between {first.get('waktu')} and "
+           f"{events[-1].get('waktu')} by user: {first.get('user')}\n\n")
+    yield _suppressed_text(suppressed)
+    for event in events:
+        yield " | ".join(_plain(event.get(key)) for _, key in DIGEST_COLUMNS) + "\n"
+    yield "\n" + _text_fields(first, HOST_FIELDS)
+
+
+def usb_digest(events, suppressed=0):
+    """Return ``(text, html)``; satu event memakai layout tunggal."""
+    if len(events) == 1:
+        return usb_alert(events[0], suppressed)
+    return "".join(iter_digest_text(events, suppressed)), "".join(iter_digest_html(events, suppressed))
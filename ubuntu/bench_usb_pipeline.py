@@ -0,0 +1,481 @@
+"""Record dan replay event udev lewat jalur proses yang sama dengan agent.
+
+Contoh:
+    # Rekam event nyata (butuh akses netlink udev)
+    python bench_usb_pipeline.py record events.jsonl
+
+    # Replay rekaman 1000 event/detik ke stub SMTP lokal
+    python bench_usb_pipeline.py replay events.jsonl --rate 1000 --repeat 20
+
+    # Tanpa rekaman: event sintetis
+    python bench_usb_pipeline.py replay --synthetic 5000 --rate 0
+
+    # Collector pusat + 8 proses agent di localhost
+    python bench_usb_pipeline.py fleet --agents 8 --events 500
+"""
+
+# Built-in modules
+import argparse
+import contextlib
+import email
+import json
+import os
+import re
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Atribut sysfs yang dibaca oleh handle_usb_device
+RECORDED_ATTRIBUTES = ("manufacturer", "product", "idVendor", "idProduct", "serial")
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Server SMTP minimal: terima semua AUTH/MAIL/RCPT dan catat waktu DATA selesai."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+
+            if command.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250-stub\r\n250-AUTH PLAIN\r\n250 OK\r\n")
+            elif command.startswith("AUTH"):
+                self.reply("235 Authentication successful")
+            elif command.startswith("DATA"):
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                chunks = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b".\r\n":
+                        break
+                    chunks.append(data[1:] if data.startswith(b"..") else data)
+                self.server.received(b"".join(chunks))
+                self.reply("250 OK")
+            elif command.startswith("QUIT"):
+                self.reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self.reply("250 OK")
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, on_message):
+        super().__init__(("127.0.0.1", 0), StubSMTPHandler)
+        self.on_message = on_message
+
+    def received(self, raw):
+        self.on_message(time.monotonic(), raw)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class ReplayDevice:
+    """Pengganti pyudev.Device dengan atribut yang dipakai pipeline."""
+
+    def __init__(self, record):
+        self.action = record["action"]
+        self.subsystem = record["subsystem"]
+        self.device_type = record.get("device_type")
+        self.sys_path = record.get("sys_path", "")
+        # Rekaman lama belum punya sys_name; usb_snapshot.device_key butuh untuk hub/perangkat tanpa serial
+        self.sys_name = record.get("sys_name") or os.path.basename(self.sys_path)
+        self.properties = record.get("properties", {})
+        self.attributes = {
+            key: value.encode() for key, value in record.get("attributes", {}).items()
+        }
+
+    def get(self, key, default=None):
+        return self.properties.get(key, default)
+
+
+def device_to_record(device, t):
+    attributes = {}
+    for name in RECORDED_ATTRIBUTES:
+        value = device.attributes.get(name)
+        if value is not None:
+            attributes[name] = value.decode(errors="replace").strip()
+    return {
+        "t": t,
+        "action": device.action,
+        "subsystem": device.subsystem,
+        "device_type": device.device_type,
+        "sys_path": device.sys_path,
+        "sys_name": device.sys_name,
+        "properties": dict(device.properties),
+        "attributes": attributes,
+    }
+
+
+def synthetic_records(count):
+    for i in range(count):
+        serial = f"BENCH{i:08d}"
+        yield {
+            "t": 0.0,
+            "action": "add",
+            "subsystem": "usb",
+            "device_type": "usb_device",
+            "sys_path": f"/sys/devices/bench/usb1/1-{i}",
+            "sys_name": f"1-{i}",
+            "properties": {"ID_SERIAL": f"Bench_Disk_{serial}", "ID_SERIAL_SHORT": serial,
+                           "ID_VENDOR_ID": "1d6b", "ID_MODEL_ID": "0002"},
+            "attributes": {"manufacturer": "Bench", "product": "Disk",
+                           "idVendor": "1d6b", "idProduct": "0002", "serial": serial},
+        }
+
+
+def load_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ErrorCounter:
+    """Pengganti stdout saat replay: output agent dibuang, baris error dihitung."""
+
+    def __init__(self):
+        self.errors = []
+
+    def write(self, text):
+        for line in text.splitlines():
+            if line.startswith("Error") or line.startswith("[ERROR]"):
+                self.errors.append(line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def read_rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def record(args):
+    import usb_monitor
+
+    usb_monitor.load_config()
+    monitor = usb_monitor.create_usb_monitor()
+    monitor.start()
+    start = time.monotonic()
+    count = 0
+    print(f"Recording udev events to {args.output} (Ctrl+C to stop)...")
+    with open(args.output, "a", encoding="utf-8") as out:
+        try:
+            for device in iter(monitor.poll, None):
+                out.write(json.dumps(device_to_record(device, time.monotonic() - start)) + "\n")
+                out.flush()
+                count += 1
+                if args.limit and count >= args.limit:
+                    break
+        except KeyboardInterrupt:
+            pass
+    print(f"Recorded {count} events.")
+
+
+def replay(args):
+    if args.synthetic:
+        records = list(synthetic_records(args.synthetic))
+    elif args.input:
+        records = load_records(args.input)
+    else:
+        sys.exit("replay needs an input file or --synthetic N")
+
+    received = []  # (monotonic, serials)
+    serial_re = re.compile(r"<td>([^<]+)</td>")
+
+    def on_message(t, raw):
+        msg = email.message_from_bytes(raw)
+        text = "".join(
+            part.get_payload(decode=True).decode(errors="replace")
+            for part in msg.walk() if not part.is_multipart()
+        )
+        received.append((t, set(serial_re.findall(text))))
+
+    stub = StubSMTPServer(on_message).start()
+
+    # Konfigurasi diarahkan ke stub sebelum modul agent dimuat
+    os.environ.update({
+        "EMAIL_HOST": "127.0.0.1",
+        "EMAIL_PORT": str(stub.server_address[1]),
+        "EMAIL_HOST_USER": "bench@localhost",
+        "EMAIL_HOST_PASSWORD": "bench",
+        "TO_EMAIL": "bench@localhost",
+        "SMTP_STARTTLS": "0",
+    })
+    # Rate limiter dan debounce dilonggarkan kecuali diatur eksplisit, supaya yang diukur pipeline-nya
+    for key in ("ALERT_RATE_GLOBAL", "ALERT_BURST_GLOBAL", "ALERT_RATE_HOST", "ALERT_BURST_HOST"):
+        os.environ.setdefault(key, "1000000")
+    os.environ.setdefault("DEVICE_DEBOUNCE", "0")
+    if args.batch_delay is not None:
+        os.environ["ALERT_BATCH_DELAY"] = str(args.batch_delay)
+
+    import usb_monitor
+    usb_monitor.load_config()
+    usb_monitor.TEMP_DIR = usb_monitor.STATE_DIR = Path(tempfile.mkdtemp(prefix="usb-bench-"))
+
+    usb_monitor.get_sinks()
+    sender = usb_monitor.get_mail_sender()
+
+    # Catat waktu enqueue ke antrean SMTP
+    enqueued = []
+    original_enqueue = sender.enqueue
+
+    def timed_enqueue(subject, body, save_if_failed=True, text=None, **kwargs):
+        enqueued.append((time.monotonic(), set(serial_re.findall(body))))
+        return original_enqueue(subject, body, save_if_failed, text=text, **kwargs)
+
+    sender.enqueue = timed_enqueue
+
+    injected = {}  # serial -> waktu event masuk pipeline
+    interval = 1.0 / args.rate if args.rate else 0.0
+    rss_before = read_rss_kb()
+    total = len(records) * args.repeat
+
+    agent_output = ErrorCounter()
+    with contextlib.redirect_stdout(agent_output):
+        start = time.monotonic()
+        seq = 0
+        for round_no in range(args.repeat):
+            for rec in records:
+                if interval:
+                    delay = start + seq * interval - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                device = ReplayDevice(rec)
+                serial = device.get("ID_SERIAL")
+                if serial and args.repeat > 1:
+                    # Serial unik per putaran supaya dedup tidak menelan replay berikutnya
+                    serial = f"{serial}-{round_no}"
+                    device.properties = dict(device.properties, ID_SERIAL=serial,
+                                             ID_SERIAL_SHORT=f"{device.get('ID_SERIAL_SHORT')}-{round_no}")
+                if serial:
+                    injected[serial] = time.monotonic()
+                usb_monitor.handle_usb_device(device)
+                seq += 1
+        inject_time = time.monotonic() - start
+
+        usb_monitor.close_sinks()
+        deadline = time.monotonic() + args.timeout
+        while sender.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sender.stop(args.timeout)
+        drain_time = time.monotonic() - start
+
+    rss_after = read_rss_kb()
+
+    def latencies(samples):
+        result = []
+        for t, serials in samples:
+            result.extend((t - injected[s]) * 1000 for s in serials if s in injected)
+        return result
+
+    enqueue_lat = latencies(enqueued)
+    send_lat = latencies(received)
+
+    print(f"events injected     : {total}")
+    print(f"emails enqueued     : {len(enqueued)}")
+    print(f"emails received     : {len(received)}")
+    print(f"inject throughput   : {total / inject_time:.0f} events/s")
+    print(f"end-to-end          : {total / drain_time:.0f} events/s ({drain_time:.2f}s)")
+    print(f"detect->enqueue ms  : p50={percentile(enqueue_lat, 50):.2f} p99={percentile(enqueue_lat, 99):.2f}")
+    print(f"detect->send ms     : p50={percentile(send_lat, 50):.2f} p99={percentile(send_lat, 99):.2f}")
+    print(f"RSS growth          : {rss_after - rss_before} kB ({rss_before} -> {rss_after} kB)")
+    print(f"processing errors   : {len(agent_output.errors)}")
+    for line in agent_output.errors[:5]:
+        print(f"  {line}")
+    stub.shutdown()
+
+
+# Dijalankan di proses baru: waktu dari awal import sampai monitor udev aktif
+STARTUP_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import usb_monitor
+t1 = time.perf_counter()
+usb_monitor.load_config()
+monitor = usb_monitor.create_usb_monitor()
+monitor.start()
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "armed_ms": (t2 - t0) * 1000}))
+"""
+
+
+def startup(args):
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    imports, armed, wall = [], [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=here,
+                                capture_output=True, text=True, check=True).stdout
+        wall.append((time.perf_counter() - start) * 1000)
+        result = json.loads(output.strip().splitlines()[-1])
+        imports.append(result["import_ms"])
+        armed.append(result["armed_ms"])
+
+    print(f"runs                : {args.runs}")
+    print(f"import usb_monitor  : p50={percentile(imports, 50):.1f} ms min={min(imports):.1f} ms")
+    print(f"import -> armed     : p50={percentile(armed, 50):.1f} ms min={min(armed):.1f} ms")
+    print(f"process -> armed    : p50={percentile(wall, 50):.1f} ms (incl. interpreter start/exit)")
+
+
+# Dijalankan di proses agent: kirim event sintetis ke collector lewat CollectorClient
+FLEET_AGENT = """
+import json, sys, time
+import collector
+address, hostname, count = sys.argv[1], sys.argv[2], int(sys.argv[3])
+client = collector.CollectorClient(address, hostname, max_delay=0.05).start()
+start = time.monotonic()
+for i in range(count):
+    serial = f"{hostname}-{i:06d}"
+    client.send({"type": "usb_attach", "action": "add", "time": time.time(),
+                 "waktu": time.strftime("%Y-%m-%d %H:%M:%S"), "user": "bench",
+                 "name": "Disk", "manufacturer": "Bench", "serial": serial,
+                 "subsystem": "USB", "hostname": hostname, "ip": "127.0.0.1",
+                 "mac": "00:00:00:00:00:00", "os": "Linux"})
+client.close(30)
+print(json.dumps({"seconds": time.monotonic() - start}))
+"""
+
+
+def fleet(args):
+    import signal
+    import socket
+    import subprocess
+
+    received = []  # (monotonic, serials)
+    serial_re = re.compile(r"<td>(bench-host-\d+-\d+)</td>")
+
+    def on_message(t, raw):
+        msg = email.message_from_bytes(raw)
+        html = "".join(
+            part.get_payload(decode=True).decode(errors="replace")
+            for part in msg.walk() if part.get_content_type() == "text/html"
+        )
+        received.append((t, set(serial_re.findall(html))))
+
+    stub = StubSMTPServer(on_message).start()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    address = f"127.0.0.1:{port}"
+
+    env = dict(os.environ, EMAIL_HOST="127.0.0.1", EMAIL_PORT=str(stub.server_address[1]),
+               EMAIL_HOST_USER="bench@localhost", EMAIL_HOST_PASSWORD="bench",
+               TO_EMAIL="bench@localhost", SMTP_STARTTLS="0", METRICS_ADDR="",
+               EVENT_LOG_PATH="", COLLECTOR_ADDR="")
+    for key in ("ALERT_RATE_GLOBAL", "ALERT_BURST_GLOBAL", "ALERT_RATE_HOST", "ALERT_BURST_HOST"):
+        env.setdefault(key, "1000000")
+    env.setdefault("DEVICE_DEBOUNCE", "0")
+    env.setdefault("ALERT_BATCH_DELAY", "0.2")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    state_dir = tempfile.mkdtemp(prefix="usb-fleet-")
+    server = subprocess.Popen([sys.executable, "collector.py", "--listen", address,
+                               "--state-dir", state_dir],
+                              cwd=here, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                server.kill()
+                sys.exit("collector did not start")
+            time.sleep(0.05)
+
+    start = time.monotonic()
+    agents = [
+        subprocess.Popen([sys.executable, "-c", FLEET_AGENT, address, f"bench-host-{i}",
+                          str(args.events)], cwd=here, stdout=subprocess.PIPE, text=True)
+        for i in range(args.agents)
+    ]
+    agent_seconds = [json.loads(agent.communicate()[0].strip().splitlines()[-1])["seconds"]
+                     for agent in agents]
+    forwarded = time.monotonic() - start
+
+    total = args.agents * args.events
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        if len(set().union(*(serials for _, serials in received))) >= total:
+            break
+        time.sleep(0.05)
+    delivered = time.monotonic() - start
+    server.send_signal(signal.SIGTERM)
+    server.wait(args.timeout)
+
+    seen = set().union(*(serials for _, serials in received))
+    print(f"agents              : {args.agents}")
+    print(f"events sent         : {total}")
+    print(f"events in emails    : {len(seen)}")
+    print(f"emails received     : {len(received)}")
+    print(f"agent forward time  : p50={percentile(agent_seconds, 50):.2f}s max={max(agent_seconds):.2f}s")
+    print(f"sent -> acked       : {total / forwarded:.0f} events/s ({forwarded:.2f}s)")
+    print(f"sent -> emailed     : {total / delivered:.0f} events/s ({delivered:.2f}s)")
+    stub.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="USB event pipeline benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="record live udev events to a JSON-lines file")
+    rec.add_argument("output")
+    rec.add_argument("--limit", type=int, default=0, help="stop after N events")
+
+    rep = sub.add_parser("replay", help="replay events through handle_usb_device")
+    rep.add_argument("input", nargs="?")
+    rep.add_argument("--synthetic", type=int, default=0, help="generate N synthetic add events")
+    rep.add_argument("--rate", type=float, default=0, help="events per second (0 = unthrottled)")
+    rep.add_argument("--repeat", type=int, default=1)
+    rep.add_argument("--batch-delay", type=float, default=None, help="override ALERT_BATCH_DELAY")
+    rep.add_argument("--timeout", type=float, default=60, help="max seconds to wait for delivery")
+
+    st = sub.add_parser("startup", help="measure time from process start to armed udev monitor")
+    st.add_argument("--runs", type=int, default=10)
+
+    fl = sub.add_parser("fleet", help="run a collector and several agent processes on localhost")
+    fl.add_argument("--agents", type=int, default=4)
+    fl.add_argument("--events", type=int, default=200, help="events per agent")
+    fl.add_argument("--timeout", type=float, default=60, help="max seconds to wait for delivery")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args)
+    elif args.command == "startup":
+        startup(args)
+    elif args.command == "fleet":
+        fleet(args)
+    else:
+        replay(args)
+
+
+if __name__ == "__main__":
+    main()
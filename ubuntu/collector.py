@@ -0,0 +1,477 @@
+"""Collector pusat: agent mengirim event lewat TCP, collector yang mengirim email.
+
+Dengan collector, endpoint tidak lagi login ke SMTP sendiri-sendiri; kredensial
+email cukup ada di host collector. Dedup, penggabungan digest, rate limit, dan
+spool email gagal memakai jalur yang sama dengan agent (usb_monitor).
+
+Protokol (semua integer big-endian)::
+
+    frame     = length:u32 | version:u8 | type:u8 | seq:u32 | body
+    CHALLENGE body = nonce:16 bytes (dikirim collector begitu koneksi diterima)
+    HELLO     body = session:u64 | mac:32 bytes | hostname (utf-8)
+    BATCH     body = count:u16 | record * count
+    ACK       body kosong, seq = seq BATCH yang diterima
+    REJECT    body = alasan (utf-8), seq = seq BATCH yang ditolak (0 = HELLO ditolak)
+    record    = nfields:u8 | field * nfields
+    field     = id:u8 [| keylen:u8 | key] | vallen:u16 | value (utf-8)
+
+``id`` 0 berarti nama field ditulis langsung; ``vallen`` 0xFFFF berarti None.
+``mac`` adalah HMAC-SHA256(COLLECTOR_SECRET, nonce | session | hostname); tanpa
+secret diisi nol, dan collector tanpa secret menerima semua agent.
+Agent mengirim ulang BATCH yang belum di-ACK setelah reconnect; collector
+membuang BATCH dengan (host, session, seq) yang sudah pernah diproses. BATCH
+yang tidak bisa di-decode dibalas REJECT dan dibuang oleh agent.
+
+Collector secara default hanya listen di loopback. Jika listen di alamat lain,
+isi COLLECTOR_SECRET yang sama di collector dan semua agent: tanpa itu host mana
+pun bisa menyuntikkan event yang dikirim dengan kredensial email pusat.
+
+Contoh:
+    COLLECTOR_SECRET=... python collector.py --listen 0.0.0.0:7515
+"""
+
+# Built-in modules
+import argparse
+import collections
+import hashlib
+import hmac
+import os
+import random
+import signal
+import socket
+import struct
+import threading
+import time
+from pathlib import Path
+
+# Local modules
+import metrics
+import sinks
+
+VERSION = 2
+HELLO, BATCH, ACK, CHALLENGE, REJECT = 1, 2, 3, 4, 5
+DEFAULT_PORT = 7515
+MAX_FRAME = 4 * 1024 * 1024
+NONCE_SIZE = 16
+
+HEADER = struct.Struct(">IBBI")  # length, version, type, seq
+HELLO_BODY = struct.Struct(">Q32s")  # session, mac
+U8 = struct.Struct(">B")
+U16 = struct.Struct(">H")
+NONE_VALUE = 0xFFFF
+
+# Field yang sering muncul dikirim sebagai id satu byte, bukan nama lengkap.
+# Hanya boleh ditambah di akhir supaya agent lama tetap kompatibel.
+FIELDS = ("type", "action", "time", "waktu", "user", "name", "manufacturer", "serial",
+          "subsystem", "hostname", "ip", "mac", "os", "previous_ip", "vendor_id", "model_id",
+          "interface", "violations", "link")
+FIELD_IDS = {name: i + 1 for i, name in enumerate(FIELDS)}
+
+EVENTS_FORWARDED = metrics.REGISTRY.counter("usbnotify_collector_events_forwarded_total", "Events acknowledged by the collector")
+EVENTS_DROPPED = metrics.REGISTRY.counter("usbnotify_collector_events_dropped_total", "Events dropped because the forward buffer was full")
+EVENTS_RECEIVED = metrics.REGISTRY.counter("usbnotify_collector_events_received_total", "Events received from agents")
+DUPLICATE_BATCHES = metrics.REGISTRY.counter("usbnotify_collector_duplicate_batches_total", "Re-sent batches ignored by the collector")
+EVENTS_REJECTED = metrics.REGISTRY.counter("usbnotify_collector_events_rejected_total", "Forwarded events dropped because the collector could not decode their batch")
+AGENTS_REJECTED = metrics.REGISTRY.counter("usbnotify_collector_agents_rejected_total", "Agent connections refused because HELLO failed authentication")
+AGENTS_CONNECTED = metrics.REGISTRY.gauge("usbnotify_collector_agents_connected", "Agents currently connected to the collector")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class BatchRejected(Exception):
+    """Collector menolak BATCH ini secara permanen; mengirim ulang tidak ada gunanya."""
+
+
+def hello_mac(secret, nonce, session, hostname):
+    if not secret:
+        return bytes(32)
+    message = nonce + struct.pack(">Q", session) + hostname
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).digest()
+
+
+def parse_address(address, default_host="127.0.0.1"):
+    host, _, port = address.rpartition(":")
+    return host.strip("[]") or default_host, int(port or DEFAULT_PORT)
+
+
+def encode_frame(kind, seq, body=b""):
+    return HEADER.pack(HEADER.size - 4 + len(body), VERSION, kind, seq) + body
+
+
+def decode_header(data):
+    """Return ``(body_length, type, seq)`` dari 10 byte header frame."""
+    length, version, kind, seq = HEADER.unpack(data)
+    if version != VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    body_length = length - (HEADER.size - 4)
+    if body_length < 0 or body_length > MAX_FRAME:
+        raise ProtocolError(f"invalid frame length {length}")
+    return body_length, kind, seq
+
+
+def _encode_str(value, limit):
+    data = str(value).encode("utf-8", errors="replace")
+    return data[:limit]
+
+
+def encode_event(event):
+    parts = [U8.pack(min(len(event), 255))]
+    for key, value in list(event.items())[:255]:
+        field_id = FIELD_IDS.get(key, 0)
+        parts.append(U8.pack(field_id))
+        if not field_id:
+            name = _encode_str(key, 255)
+            parts.append(U8.pack(len(name)) + name)
+        if value is None:
+            parts.append(U16.pack(NONE_VALUE))
+        else:
+            data = _encode_str(value, NONE_VALUE - 1)
+            parts.append(U16.pack(len(data)) + data)
+    return b"".join(parts)
+
+
+def encode_batch(events):
+    return U16.pack(len(events)) + b"".join(encode_event(event) for event in events)
+
+
+def decode_batch(body):
+    view = memoryview(body)
+    events = []
+    try:
+        (count,), pos = U16.unpack_from(view, 0), U16.size
+        for _ in range(count):
+            (nfields,), pos = U8.unpack_from(view, pos), pos + 1
+            event = {}
+            for _ in range(nfields):
+                (field_id,), pos = U8.unpack_from(view, pos), pos + 1
+                if field_id:
+                    # Id dari agent yang lebih baru: nilainya tetap bisa dibaca, namanya belum dikenal
+                    key = FIELDS[field_id - 1] if field_id <= len(FIELDS) else f"field_{field_id}"
+                else:
+                    (size,), pos = U8.unpack_from(view, pos), pos + 1
+                    key, pos = bytes(view[pos:pos + size]).decode("utf-8", errors="replace"), pos + size
+                (size,), pos = U16.unpack_from(view, pos), pos + U16.size
+                if size == NONE_VALUE:
+                    event[key] = None
+                else:
+                    event[key], pos = bytes(view[pos:pos + size]).decode("utf-8", errors="replace"), pos + size
+            events.append(event)
+    except struct.error as e:
+        raise ProtocolError(f"truncated batch: {e}") from None
+    if pos != len(view):
+        raise ProtocolError(f"{len(view) - pos} trailing bytes after batch")
+    return events
+
+
+class CollectorClient:
+    """Kirim event ke collector dari thread terpisah, dengan batching dan reconnect.
+
+    ``send`` tidak pernah blocking: event masuk buffer berukuran ``max_pending``
+    (event tertua dibuang jika penuh). Batch dikirim setelah ``max_delay`` detik
+    atau saat mencapai ``max_batch`` event, lalu ditahan sampai di-ACK.
+    """
+
+    def __init__(self, address, hostname, max_batch=200, max_delay=0.5, max_pending=10000,
+                 timeout=10, max_backoff=60, secret=None):
+        self.address = parse_address(address)
+        self.hostname = hostname
+        self.secret = secret
+        self.max_batch = min(max_batch, 0xFFFF)
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+
+        # Session acak per proses: seq mulai dari 1 lagi setelah restart
+        self.session = random.getrandbits(64)
+        self.seq = 0
+        self.sock = None
+        self.pending = collections.deque()
+        self.cond = threading.Condition()
+        self.closing = False
+        self.close_deadline = 0.0
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="collector-client", daemon=True)
+            self.thread.start()
+        return self
+
+    def send(self, event):
+        with self.cond:
+            if len(self.pending) >= self.max_pending:
+                self.pending.popleft()
+                EVENTS_DROPPED.inc()
+            self.pending.append(event)
+            if len(self.pending) == 1 or len(self.pending) >= self.max_batch:
+                self.cond.notify()
+
+    def close(self, timeout=10):
+        """Kirim sisa buffer (paling lama ``timeout`` detik) lalu putuskan koneksi."""
+        with self.cond:
+            self.closing = True
+            self.close_deadline = time.monotonic() + timeout
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout + 1)
+            self.thread = None
+        with self.cond:
+            if self.pending:
+                print(f"Collector unreachable, {len(self.pending)} events not forwarded.")
+        self._disconnect()
+
+    def _next_batch(self):
+        with self.cond:
+            while not self.pending and not self.closing:
+                self.cond.wait()
+            if not self.pending:
+                return None
+            # Tunggu event lain yang datang berdekatan, kecuali sedang shutdown
+            deadline = time.monotonic() + self.max_delay
+            while len(self.pending) < self.max_batch and not self.closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            count = min(len(self.pending), self.max_batch)
+            return [self.pending.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.seq = (self.seq + 1) & 0xFFFFFFFF or 1
+            frame = encode_frame(BATCH, self.seq, encode_batch(batch))
+            backoff = 1.0
+            while True:
+                try:
+                    self._send_frame(frame, self.seq)
+                    EVENTS_FORWARDED.inc(len(batch))
+                    break
+                except BatchRejected as e:
+                    # Dikirim ulang pun akan ditolak lagi dan menahan semua event berikutnya
+                    EVENTS_REJECTED.inc(len(batch))
+                    print(f"Collector rejected a batch of {len(batch)} events, dropping it: {e}")
+                    break
+                except (OSError, ProtocolError) as e:
+                    self._disconnect()
+                    print(f"Error forwarding to collector {self.address[0]}:{self.address[1]}: {e}")
+                with self.cond:
+                    if self.closing:
+                        remaining = self.close_deadline - time.monotonic()
+                        if remaining <= 0:
+                            # Batch yang belum di-ACK dikembalikan supaya tercatat saat close
+                            self.pending.extendleft(reversed(batch))
+                            return
+                        self.cond.wait(min(backoff, remaining))
+                    else:
+                        self.cond.wait(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        body_length, kind, _ = decode_header(self._recv_exactly(HEADER.size))
+        nonce = self._recv_exactly(body_length)
+        if kind != CHALLENGE or len(nonce) != NONCE_SIZE:
+            raise ProtocolError(f"expected CHALLENGE, got type={kind}")
+        hostname = self.hostname.encode("utf-8", errors="replace")
+        mac = hello_mac(self.secret, nonce, self.session, hostname)
+        sock.sendall(encode_frame(HELLO, 0, HELLO_BODY.pack(self.session, mac) + hostname))
+
+    def _disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _send_frame(self, frame, seq):
+        if self.sock is None:
+            self._connect()
+        self.sock.sendall(frame)
+        header = self._recv_exactly(HEADER.size)
+        body_length, kind, ack_seq = decode_header(header)
+        body = self._recv_exactly(body_length)
+        if kind == REJECT:
+            reason = body.decode("utf-8", errors="replace")
+            if ack_seq == seq:
+                raise BatchRejected(reason)
+            # seq 0: HELLO ditolak (mis. COLLECTOR_SECRET berbeda); dicoba lagi dengan backoff
+            raise ProtocolError(f"collector refused connection: {reason}")
+        if kind != ACK or ack_seq != seq:
+            raise ProtocolError(f"unexpected reply type={kind} seq={ack_seq}")
+
+    def _recv_exactly(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed by collector")
+            data += chunk
+        return data
+
+
+class CollectorSink(sinks.Sink):
+    """Teruskan semua event ke collector pusat alih-alih mengirim email sendiri."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def emit(self, event):
+        self.client.send(event)
+
+    def close(self):
+        self.client.close()
+
+
+class CollectorServer:
+    """Terima BATCH dari agent dan serahkan tiap event ke ``handle_event``.
+
+    Jika ``secret`` diisi, agent harus membuktikan secret yang sama di HELLO.
+    """
+
+    def __init__(self, handle_event, secret=None):
+        self.handle_event = handle_event
+        self.secret = secret
+        self.sessions = {}  # hostname -> (session, seq terakhir yang diproses)
+        self.writers = set()
+        AGENTS_CONNECTED.callback = lambda: len(self.writers)
+
+    async def close(self):
+        """Putuskan semua agent; batch yang belum di-ACK akan dikirim ulang oleh agent."""
+        import asyncio
+
+        writers = list(self.writers)
+        for writer in writers:
+            writer.close()
+        # Beri kesempatan handler selesai sebelum loop berhenti
+        await asyncio.sleep(0)
+
+    async def handle(self, reader, writer):
+        import asyncio
+
+        peer = writer.get_extra_info("peername")
+        self.writers.add(writer)
+        try:
+            nonce = os.urandom(NONCE_SIZE)
+            writer.write(encode_frame(CHALLENGE, 0, nonce))
+            body_length, kind, _ = decode_header(await reader.readexactly(HEADER.size))
+            body = await reader.readexactly(body_length)
+            if kind != HELLO or len(body) < HELLO_BODY.size:
+                raise ProtocolError("expected HELLO")
+            session, mac = HELLO_BODY.unpack_from(body)
+            raw_hostname = body[HELLO_BODY.size:]
+            if self.secret and not hmac.compare_digest(
+                    mac, hello_mac(self.secret, nonce, session, raw_hostname)):
+                AGENTS_REJECTED.inc()
+                writer.write(encode_frame(REJECT, 0, b"authentication failed"))
+                await writer.drain()
+                raise ProtocolError("HELLO authentication failed")
+            hostname = raw_hostname.decode("utf-8", errors="replace")
+            print(f"[INFO] Agent {hostname} connected from {peer}")
+
+            while True:
+                body_length, kind, seq = decode_header(await reader.readexactly(HEADER.size))
+                body = await reader.readexactly(body_length)
+                if kind != BATCH:
+                    raise ProtocolError(f"unexpected frame type {kind}")
+                try:
+                    self._process(hostname, session, seq, body)
+                except ProtocolError as e:
+                    # Batch rusak ditolak permanen supaya tidak menahan batch berikutnya
+                    print(f"Rejected batch {seq} from {hostname}: {e}")
+                    writer.write(encode_frame(REJECT, seq, str(e).encode("utf-8")))
+                else:
+                    writer.write(encode_frame(ACK, seq))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        except (OSError, ProtocolError) as e:
+            print(f"Agent connection {peer} closed: {e}")
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def _process(self, hostname, session, seq, body):
+        last_session, last_seq = self.sessions.get(hostname, (None, 0))
+        if session == last_session and seq <= last_seq:
+            # ACK sebelumnya hilang; agent mengirim ulang batch yang sudah diproses
+            DUPLICATE_BATCHES.inc()
+            return
+        events = decode_batch(body)
+        self.sessions[hostname] = (session, seq)
+        EVENTS_RECEIVED.inc(len(events))
+        for event in events:
+            event.setdefault("hostname", hostname)
+            try:
+                self.handle_event(event)
+            except Exception as e:
+                print(f"Error handling event from {hostname}: {e}")
+
+
+async def serve(address, secret=None):
+    import asyncio
+    import ipaddress
+    import usb_monitor
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Collector selalu mengirim email sendiri, tidak meneruskan ke collector lain
+    usb_monitor.get_sinks(loop, forward=False)
+    collector = CollectorServer(usb_monitor.emit_event, secret=secret)
+    host, port = parse_address(address)
+    server = await asyncio.start_server(collector.handle, host, port)
+    print(f"[INFO] Collector listening on {host}:{port}")
+    try:
+        loopback = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = host == "localhost"
+    if not secret and not loopback:
+        print("[WARN] COLLECTOR_SECRET is not set: any host that can reach this port can inject alerts.")
+
+    resend_scheduler = usb_monitor.start_resend_scheduler(loop)
+    config_reloader = usb_monitor.ConfigReloader()
+    config_reloader.start(loop)
+    usb_monitor.get_failed_spool()
+    metrics_server = usb_monitor.start_metrics(loop)
+
+    await stop.wait()
+    print("[INFO] Shutting down collector, draining pending alerts...")
+    server.close()
+    await collector.close()
+    await server.wait_closed()
+    resend_scheduler.cancel()
+    config_reloader.stop(loop)
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    await usb_monitor.shutdown_alerting(loop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Central USB/IP alert collector")
+    parser.add_argument("--listen", default=None,
+                        help=f"host:port to listen on (default: COLLECTOR_LISTEN or 127.0.0.1:{DEFAULT_PORT})")
+    parser.add_argument("--state-dir", default=None, help="directory for the failed-email spool")
+    args = parser.parse_args()
+
+    import asyncio
+    import config
+    import usb_monitor
+
+    usb_monitor.load_config()
+    if args.state_dir:
+        usb_monitor.TEMP_DIR = usb_monitor.STATE_DIR = Path(args.state_dir)
+    cfg = config.current()
+    address = args.listen or cfg.collector_listen or f"127.0.0.1:{DEFAULT_PORT}"
+    asyncio.run(serve(address, secret=cfg.collector_secret))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Konfigurasi agent: snapshot immutable yang sudah di-parse dari environment + .env.
+
+``load()`` membaca .env sekali saat start; ``current()`` mengembalikan snapshot
+aktif. Saat .env atau IP_POLICY_FILE berubah (lihat ``EnvFileWatcher``), ``reload()`` membangun
+snapshot baru dan menukarnya dengan satu assignment; snapshot lama tetap utuh
+untuk pemanggil yang masih memegangnya. Jika .env baru tidak valid, snapshot
+lama tetap dipakai.
+
+Variabel environment proses selalu menang atas isi .env (sama seperti
+``load_dotenv()`` tanpa override).
+"""
+
+# Built-in modules
+import os
+import struct
+from collections import namedtuple
+
+DEFAULT_UDEV_EVENT_FILTER = "usb/usb_device:add|remove,net:add|remove|move"
+
+Config = namedtuple("Config", [
+    # Email / delivery
+    "email_host", "email_port", "email_user", "email_password", "recipients",
+    "email_fallback_hosts", "smtp_starttls", "smtp_timeout", "smtp_keepalive",
+    "mail_queue_size", "syslog_socket", "webhook_url", "webhook_timeout", "delivery_workers",
+    # Alert
+    "alert_batch_delay", "alert_batch_size", "alert_rate_global", "alert_burst_global",
+    "alert_rate_host", "alert_burst_host", "device_debounce",
+    # Spool
+    "resend_batch_bytes", "resend_backoff_min", "resend_backoff_max",
+    # Host / IP
+    "host_info_ttl", "ip_policy", "ip_policy_file",
+    # udev
+    "udev_event_filter", "udev_filter_tag", "udev_rcvbuf",
+    # Sink, inventaris, usb.ids
+    "event_log_path", "event_log_max_bytes", "event_log_max_age", "event_log_gzip",
+    "state_dir", "inventory_db", "inventory_default_policy", "usb_ids_path", "usb_ids_index",
+    # Collector
+    "collector_addr", "collector_batch_size", "collector_batch_delay", "collector_buffer",
+    "collector_listen", "collector_secret",
+    # Metrics
+    "metrics_addr", "metrics_textfile", "metrics_textfile_interval",
+])
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def parse_event_filter(spec):
+    """Ubah "subsystem[/devtype]:action|action,..." menjadi {(subsystem, devtype): frozenset(action)}."""
+    allowed = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        match, _, actions = item.partition(":")
+        subsystem, _, devtype = match.partition("/")
+        key = (subsystem.strip(), devtype.strip() or None)
+        allowed[key] = allowed.get(key, frozenset()) | frozenset(
+            a.strip() for a in actions.split("|") if a.strip()
+        )
+    return allowed
+
+
+def parse_hosts(spec, default_port):
+    """"host:port,host" -> ((host, port), ...)."""
+    hosts = []
+    for entry in spec.split(","):
+        host, _, port = entry.strip().partition(":")
+        if host:
+            hosts.append((host, int(port or default_port)))
+    return tuple(hosts)
+
+
+class _Reader:
+    """Ambil nilai dari mapping env; string kosong dianggap tidak diisi."""
+
+    def __init__(self, env):
+        self.env = env
+
+    def raw(self, key, default=None):
+        value = self.env.get(key)
+        return default if value is None or value == "" else value
+
+    def parse(self, key, parser, default):
+        value = self.raw(key)
+        if value is None:
+            return default
+        try:
+            return parser(value)
+        except ValueError as e:
+            raise ConfigError(f"Invalid value for {key}: {value!r} ({e})") from None
+
+    def str(self, key, default=None):
+        return self.raw(key, default)
+
+    def check(self, key, value, minimum=None, above=None):
+        # Nilai di luar rentang tidak gagal saat parse tetapi merusak worker saat dipakai
+        # (timeout 0 = busy loop, keepalive negatif = thread mail mati)
+        if minimum is not None and value < minimum:
+            raise ConfigError(f"Invalid value for {key}: {value!r} (must be >= {minimum})")
+        if above is not None and value <= above:
+            raise ConfigError(f"Invalid value for {key}: {value!r} (must be > {above})")
+        return value
+
+    def int(self, key, default, minimum=None):
+        return self.check(key, self.parse(key, int, default), minimum)
+
+    def float(self, key, default, minimum=None, above=None):
+        return self.check(key, self.parse(key, float, default), minimum, above)
+
+    def bool(self, key, default):
+        return self.parse(key, lambda v: v.strip().lower() not in ("0", "false", "no", "off"), default)
+
+    def list(self, key):
+        return self.parse(key, lambda v: tuple(i.strip() for i in v.split(",") if i.strip()), ())
+
+
+def build(env):
+    """Bangun Config dari mapping env; ConfigError jika ada nilai yang tidak valid."""
+    import ip_policy
+
+    get = _Reader(env)
+    policy_file = get.str("IP_POLICY_FILE")
+    try:
+        policy = ip_policy.load_policy(get.str("IP_POLICY", ""), path=policy_file,
+                                       valid_ip_prefix=get.str("VALID_IP_PREFIX", ""))
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"Invalid IP policy: {e}") from None
+    # Policy tidak dikenal membuat Inventory gagal dibuat di setiap event USB
+    import inventory
+    default_policy = get.str("INVENTORY_DEFAULT_POLICY", "notify_once")
+    if default_policy not in inventory.POLICIES:
+        raise ConfigError(f"Invalid value for INVENTORY_DEFAULT_POLICY: {default_policy!r} "
+                          f"(expected one of {', '.join(inventory.POLICIES)})")
+    backoff_min = get.float("RESEND_BACKOFF_MIN", 30.0, above=0)
+    backoff_max = get.float("RESEND_BACKOFF_MAX", 3600.0, above=0)
+    if backoff_min > backoff_max:
+        raise ConfigError(f"RESEND_BACKOFF_MIN ({backoff_min}) is larger than RESEND_BACKOFF_MAX ({backoff_max})")
+
+    return Config(
+        email_host=get.str("EMAIL_HOST"),
+        email_port=get.int("EMAIL_PORT", 587, minimum=1),
+        email_user=get.str("EMAIL_HOST_USER"),
+        email_password=get.str("EMAIL_HOST_PASSWORD"),
+        recipients=get.list("TO_EMAIL"),
+        email_fallback_hosts=get.parse("EMAIL_FALLBACK_HOSTS", lambda v: parse_hosts(v, 587), ()),
+        smtp_starttls=get.bool("SMTP_STARTTLS", True),
+        smtp_timeout=get.float("SMTP_TIMEOUT", 30.0, above=0),
+        smtp_keepalive=get.int("SMTP_KEEPALIVE", 60, minimum=1),
+        mail_queue_size=get.int("MAIL_QUEUE_SIZE", 100, minimum=1),
+        syslog_socket=get.str("SYSLOG_SOCKET"),
+        webhook_url=get.str("WEBHOOK_URL"),
+        webhook_timeout=get.float("WEBHOOK_TIMEOUT", 10.0, above=0),
+        delivery_workers=get.int("DELIVERY_WORKERS", 4, minimum=1),
+        alert_batch_delay=get.float("ALERT_BATCH_DELAY", 2.0, minimum=0),
+        alert_batch_size=get.int("ALERT_BATCH_SIZE", 50, minimum=1),
+        # Rate dalam alert per menit
+        alert_rate_global=get.float("ALERT_RATE_GLOBAL", 30.0, above=0),
+        alert_burst_global=get.int("ALERT_BURST_GLOBAL", 10, minimum=1),
+        alert_rate_host=get.float("ALERT_RATE_HOST", 10.0, above=0),
+        alert_burst_host=get.int("ALERT_BURST_HOST", 5, minimum=1),
+        device_debounce=get.float("DEVICE_DEBOUNCE", 30.0, minimum=0),
+        resend_batch_bytes=get.int("RESEND_BATCH_BYTES", 256 * 1024, minimum=1),
+        resend_backoff_min=backoff_min,
+        resend_backoff_max=backoff_max,
+        host_info_ttl=get.int("HOST_INFO_TTL", 300, minimum=0),
+        ip_policy=policy,
+        ip_policy_file=policy_file,
+        udev_event_filter=parse_event_filter(get.str("UDEV_EVENT_FILTER", DEFAULT_UDEV_EVENT_FILTER)),
+        udev_filter_tag=get.str("UDEV_FILTER_TAG"),
+        udev_rcvbuf=get.int("UDEV_RCVBUF", 8 * 1024 * 1024, minimum=1),
+        event_log_path=get.str("EVENT_LOG_PATH"),
+        event_log_max_bytes=get.int("EVENT_LOG_MAX_BYTES", 10 * 1024 * 1024, minimum=1),
+        event_log_max_age=get.int("EVENT_LOG_MAX_AGE", 86400, minimum=0),
+        event_log_gzip=get.bool("EVENT_LOG_GZIP", True),
+        state_dir=get.str("STATE_DIR", "/var/lib/usbnotify"),
+        inventory_db=get.str("INVENTORY_DB"),
+        inventory_default_policy=default_policy,
+        usb_ids_path=get.str("USB_IDS_PATH"),
+        usb_ids_index=get.str("USB_IDS_INDEX"),
+        collector_addr=get.str("COLLECTOR_ADDR"),
+        collector_batch_size=get.int("COLLECTOR_BATCH_SIZE", 200, minimum=1),
+        collector_batch_delay=get.float("COLLECTOR_BATCH_DELAY", 0.5, minimum=0),
+        collector_buffer=get.int("COLLECTOR_BUFFER", 10000, minimum=1),
+        collector_listen=get.str("COLLECTOR_LISTEN"),
+        collector_secret=get.str("COLLECTOR_SECRET"),
+        metrics_addr=get.str("METRICS_ADDR"),
+        metrics_textfile=get.str("METRICS_TEXTFILE"),
+        metrics_textfile_interval=get.int("METRICS_TEXTFILE_INTERVAL", 15, minimum=1),
+    )
+
+
+def changed_fields(old, new):
+    return {field for field, a, b in zip(Config._fields, old, new) if a != b}
+
+
+_current = None
+_env_path = None
+_base_env = None
+
+
+def current():
+    return _current
+
+
+def env_path():
+    return _env_path
+
+
+def _read_env():
+    from dotenv import dotenv_values
+
+    env = {}
+    if _env_path:
+        env.update((k, v) for k, v in dotenv_values(_env_path).items() if v is not None)
+    # Environment proses menang atas .env
+    env.update(_base_env)
+    return env
+
+
+def load(path=None):
+    """Baca environment + .env pertama kali. Gagal keras jika konfigurasi tidak valid."""
+    global _current, _env_path, _base_env
+    from dotenv import find_dotenv
+
+    _base_env = dict(os.environ)
+    _env_path = path or os.getenv("USBNOTIFY_ENV") or find_dotenv() or None
+    _current = build(_read_env())
+    return _current
+
+
+def reload():
+    """Bangun ulang snapshot dari .env; snapshot lama tetap dipakai jika gagal."""
+    global _current
+    _current = build(_read_env())
+    return _current
+
+
+def watched_paths(cfg=None):
+    """File yang isinya masuk ke snapshot: .env dan IP_POLICY_FILE (jika diisi)."""
+    cfg = cfg or _current
+    paths = [_env_path] if _env_path else []
+    if cfg is not None and cfg.ip_policy_file:
+        paths.append(cfg.ip_policy_file)
+    return tuple(os.path.abspath(path) for path in paths)
+
+
+class EnvFileWatcher:
+    """inotify pada direktori file .env (dan file lain yang ikut di-reload).
+
+    Direktori yang dipantau, bukan file-nya, karena editor biasanya menulis
+    file baru lalu rename (inode lama tidak pernah berubah).
+    """
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+    def __init__(self, *paths):
+        self.paths = tuple(os.path.abspath(path) for path in paths)
+        self.names = {}  # wd -> set(nama file) di direktori itu
+        self.fd = None
+
+    def open(self):
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        for path in self.paths:
+            # Dua file di direktori yang sama mendapat wd yang sama
+            wd = libc.inotify_add_watch(fd, os.path.dirname(path).encode(), mask)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(error, f"inotify_add_watch failed for {path}")
+            self.names.setdefault(wd, set()).add(os.path.basename(path).encode())
+        self.fd = fd
+        return self
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def read_changed(self):
+        """Baca semua event yang menunggu; True jika salah satunya mengenai file yang dipantau."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return changed
+            pos = 0
+            while pos + self.EVENT.size <= len(data):
+                wd, _, _, length = self.EVENT.unpack_from(data, pos)
+                name = data[pos + self.EVENT.size:pos + self.EVENT.size + length].rstrip(b"\0")
+                if name in self.names.get(wd, ()):
+                    changed = True
+                pos += self.EVENT.size + length
@@ -0,0 +1,388 @@
+# Built-in modules
+import json
+import os
+import smtplib
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Email modules (built-in, tapi spesifik)
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# Local modules
+import metrics
+
+SMTP_CONNECT_SECONDS = metrics.REGISTRY.histogram("usbnotify_smtp_connect_seconds", "SMTP connect + EHLO/STARTTLS duration")
+SMTP_LOGIN_SECONDS = metrics.REGISTRY.histogram("usbnotify_smtp_login_seconds", "SMTP LOGIN duration")
+SMTP_SEND_SECONDS = metrics.REGISTRY.histogram("usbnotify_smtp_send_seconds", "SMTP sendmail duration")
+TRANSPORT_FAILURES = metrics.REGISTRY.counter("usbnotify_transport_failures_total", "Failed deliveries per transport")
+
+
+class Transport:
+    """Satu jalur pengiriman alert. ``send`` melempar exception jika gagal.
+
+    Transport ``required`` wajib berhasil: jika gagal, alert masuk spool dan
+    dikirim ulang hanya lewat transport wajib. Transport lain (syslog, webhook)
+    bersifat tambahan dan tidak pernah menggantikannya.
+    """
+
+    name = "transport"
+    timeout = 30
+    required = False
+
+    def __init__(self):
+        # Satu pengiriman per transport pada satu waktu (sesi SMTP tidak thread-safe)
+        self.lock = threading.Lock()
+
+    def send(self, subject, html, text=None, deadline=None, cancelled=None):
+        """``deadline`` (time.monotonic) membatasi seluruh pengiriman; ``cancelled``
+        (threading.Event) di-set jika Delivery sudah berhenti menunggu."""
+        raise NotImplementedError
+
+    def probe(self):
+        """Cek murah apakah tujuan bisa dihubungi, tanpa mengirim alert."""
+        return True
+
+    def keepalive(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SMTPRelay:
+    """Satu sesi SMTP (STARTTLS + LOGIN) yang dijaga tetap terbuka."""
+
+    def __init__(self, host, port, user, password, starttls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.server = None
+
+    def connect(self, timeout=None):
+        start = time.perf_counter()
+        server = smtplib.SMTP(self.host, self.port, timeout=timeout or self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                server.starttls()
+                server.ehlo()
+            SMTP_CONNECT_SECONDS.observe(time.perf_counter() - start)
+            with SMTP_LOGIN_SECONDS.time():
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+
+    def disconnect(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+    def noop(self):
+        # Sesi idle: kirim NOOP supaya server tidak memutus koneksi
+        if self.server is None:
+            return
+        try:
+            code, _ = self.server.noop()
+            if code != 250:
+                raise smtplib.SMTPException(f"NOOP returned {code}")
+        except Exception as e:
+            print(f"SMTP keepalive to {self.host} failed, closing session: {e}")
+            self.disconnect()
+
+    def probe(self):
+        # Sesi yang sudah terbuka cukup di-NOOP; jika tidak, cukup banner + EHLO tanpa login
+        if self.server is not None:
+            self.noop()
+            if self.server is not None:
+                return True
+        try:
+            server = smtplib.SMTP(self.host, self.port, timeout=min(self.timeout, 10))
+        except Exception:
+            return False
+        try:
+            server.ehlo()
+            return True
+        except Exception:
+            return False
+        finally:
+            server.close()
+
+    def sendmail(self, from_addr, recipients, message, timeout=None):
+        """Kirim dalam ``timeout`` detik (default: timeout relay), termasuk reconnect."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        # Percobaan kedua memakai koneksi baru jika sesi lama sudah mati
+        for attempt in range(2):
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise TimeoutError(f"no time left for {self.host}")
+                if self.server is None:
+                    self.connect(remaining)
+                else:
+                    self.server.sock.settimeout(remaining)
+                with SMTP_SEND_SECONDS.time():
+                    self.server.sendmail(from_addr, recipients, message)
+                # Sesi idle (NOOP) kembali memakai timeout normal
+                self.server.sock.settimeout(self.timeout)
+                return
+            except Exception:
+                self.disconnect()
+                if attempt or remaining <= 0:
+                    raise
+
+
+class SMTPTransport(Transport):
+    """Kirim lewat relay SMTP berurutan: relay berikutnya dipakai jika yang sebelumnya gagal.
+
+    ``timeout`` adalah batas untuk satu relay; batas seluruh transport adalah
+    ``timeout`` dikali jumlah relay. Sisa waktu dibagi rata ke relay yang belum
+    dicoba, jadi relay utama yang hang tidak menghabiskan jatah relay cadangan.
+    """
+
+    name = "smtp"
+    required = True
+
+    def __init__(self, relays, from_addr, recipients, timeout=30):
+        super().__init__()
+        self.relays = relays
+        self.from_addr = from_addr
+        self.recipients = recipients
+        self.timeout = timeout * max(1, len(relays))
+
+    def build_message(self, subject, html, text=None):
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = subject
+        msg["From"] = self.from_addr
+        msg["To"] = ", ".join(self.recipients)
+        # Urutan multipart/alternative: versi paling sederhana lebih dulu
+        if text:
+            msg.attach(MIMEText(text, "plain"))
+        msg.attach(MIMEText(html, "html"))
+        return msg.as_string()
+
+    def send(self, subject, html, text=None, deadline=None, cancelled=None):
+        message = self.build_message(subject, html, text)
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        errors = []
+        for i, relay in enumerate(self.relays):
+            # Delivery sudah menyerah (alert masuk spool): jangan kirim lewat relay berikutnya
+            if cancelled is not None and cancelled.is_set():
+                errors.append("cancelled after delivery timeout")
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                errors.append("transport deadline exceeded")
+                break
+            try:
+                relay.sendmail(self.from_addr, self.recipients, message,
+                               timeout=remaining / (len(self.relays) - i))
+                return
+            except Exception as e:
+                errors.append(f"{relay.host}: {e}")
+        raise RuntimeError("; ".join(errors) or "no SMTP relay configured")
+
+    def probe(self):
+        # Transport yang masih tertahan pengiriman lain dianggap belum siap
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            return any(relay.probe() for relay in self.relays)
+        finally:
+            self.lock.release()
+
+    def keepalive(self):
+        # Lewati jika transport sedang dipakai mengirim
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            for relay in self.relays:
+                relay.noop()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        with self.lock:
+            for relay in self.relays:
+                relay.disconnect()
+
+
+class SyslogTransport(Transport):
+    """Tulis ringkasan alert (versi teks) ke socket syslog lokal, mis. /dev/log."""
+
+    name = "syslog"
+
+    def __init__(self, path="/dev/log", ident="usbnotify", facility=4, severity=1, timeout=5):
+        super().__init__()
+        self.path = path
+        self.ident = ident
+        self.priority = facility * 8 + severity  # default: auth.alert
+        self.timeout = timeout
+        self.sock = None
+
+    def send(self, subject, html, text=None, deadline=None, cancelled=None):
+        if self.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self.sock = sock
+        body = " | ".join(line.strip() for line in (text or "").splitlines() if line.strip())
+        message = f"<{self.priority}>{self.ident}: {subject} {body}".encode("utf-8", errors="replace")
+        try:
+            self.sock.send(message)
+        except OSError:
+            self.close()
+            raise
+
+    def probe(self):
+        return self.sock is not None or os.path.exists(self.path)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class WebhookTransport(Transport):
+    """POST JSON ``{"subject", "text", "html"}`` ke URL webhook."""
+
+    name = "webhook"
+
+    def __init__(self, url, timeout=10, headers=None):
+        super().__init__()
+        self.url = url
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        self.headers.update(headers or {})
+
+    def send(self, subject, html, text=None, deadline=None, cancelled=None):
+        data = json.dumps({"subject": subject, "text": text, "html": html}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=data, headers=self.headers, method="POST")
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = max(0.1, min(timeout, deadline - time.monotonic()))
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"webhook returned HTTP {response.status}")
+
+    def probe(self):
+        url = urllib.parse.urlsplit(self.url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        try:
+            socket.create_connection((url.hostname, port), timeout=min(self.timeout, 5)).close()
+            return True
+        except OSError:
+            return False
+
+
+class Delivery:
+    """Kirim satu alert ke semua transport secara paralel.
+
+    Setiap transport punya batas waktu sendiri; transport yang lambat tidak
+    menahan yang lain. ``deliver`` mengembalikan hasil per transport;
+    ``succeeded`` menilai apakah alert terkirim (semua transport wajib berhasil).
+    """
+
+    # Tambahan waktu tunggu di atas deadline transport sebelum dianggap hang
+    GRACE = 1.0
+
+    def __init__(self, transports, max_workers=4):
+        self.transports = transports
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                           thread_name_prefix="delivery")
+        self.inflight = {}  # transport -> Future pengiriman yang belum selesai
+
+    def required(self):
+        required = [transport for transport in self.transports if transport.required]
+        return required or self.transports
+
+    def _send(self, transport, deadline, cancelled, subject, html, text):
+        with transport.lock:
+            if cancelled.is_set():
+                raise TimeoutError("delivery already timed out")
+            transport.send(subject, html, text, deadline=deadline, cancelled=cancelled)
+
+    def deliver(self, subject, html, text=None, required_only=False):
+        """Return ``{nama transport: berhasil}``.
+
+        ``required_only`` dipakai saat mengirim ulang spool, supaya syslog/webhook
+        tidak menerima alert yang sama dua kali.
+        """
+        transports = self.required() if required_only else self.transports
+        start = time.monotonic()
+        pending = {}
+        results = {}
+        for transport in transports:
+            previous = self.inflight.get(transport)
+            if previous is not None and not previous.done():
+                # Masih tertahan pengiriman sebelumnya yang hang; jangan antre di belakangnya
+                TRANSPORT_FAILURES.inc(transport=transport.name)
+                print(f"Delivery via {transport.name} skipped: previous send still running")
+                results[transport.name] = False
+                continue
+            deadline = start + transport.timeout
+            cancelled = threading.Event()
+            future = self.executor.submit(self._send, transport, deadline, cancelled, subject, html, text)
+            self.inflight[transport] = future
+            pending[transport] = (future, deadline, cancelled)
+
+        for transport, (future, deadline, cancelled) in pending.items():
+            done, _ = wait([future], timeout=max(deadline + self.GRACE - time.monotonic(), 0))
+            if not done:
+                # Batalkan sisa pekerjaan (mis. relay cadangan) karena alert akan masuk spool
+                cancelled.set()
+                TRANSPORT_FAILURES.inc(transport=transport.name)
+                print(f"Delivery via {transport.name} timed out after {transport.timeout}s")
+                results[transport.name] = False
+                continue
+            try:
+                future.result()
+                results[transport.name] = True
+            except Exception as e:
+                TRANSPORT_FAILURES.inc(transport=transport.name)
+                print(f"Delivery via {transport.name} failed: {e}")
+                results[transport.name] = False
+        return results
+
+    def succeeded(self, results):
+        """True jika semua transport wajib yang dicoba berhasil."""
+        return all(results.get(transport.name, True) for transport in self.required()) and any(results.values())
+
+    def probe(self):
+        """True jika minimal satu transport wajib (relay SMTP) bisa dihubungi."""
+        for transport in self.required():
+            try:
+                if transport.probe():
+                    return True
+            except Exception as e:
+                print(f"Probe for {transport.name} failed: {e}")
+        return False
+
+    def keepalive(self):
+        for transport in self.transports:
+            try:
+                transport.keepalive()
+            except Exception as e:
+                print(f"Keepalive for {transport.name} failed: {e}")
+
+    def close(self):
+        for transport in self.transports:
+            try:
+                transport.close()
+            except Exception as e:
+                print(f"Error closing {transport.name}: {e}")
+        self.executor.shutdown(wait=False)
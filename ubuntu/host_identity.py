@@ -0,0 +1,99 @@
+# Built-in modules
+import ipaddress
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+# Third-party modules
+import psutil
+
+HostInfo = namedtuple("HostInfo", "hostname ip mac ip_is_illegal")
+
+
+def find_addresses():
+    """Semua alamat IPv4/IPv6 per interface, tanpa loopback dan link-local (APIPA, fe80::)."""
+    addresses = []
+    for interface_name, interface_addresses in psutil.net_if_addrs().items():
+        for address in interface_addresses:
+            if address.family not in (socket.AF_INET, socket.AF_INET6):
+                continue
+            try:
+                ip = ipaddress.ip_address(address.address.split("%", 1)[0])
+            except ValueError:
+                continue
+            if not (ip.is_loopback or ip.is_link_local):
+                addresses.append((interface_name, ip))
+    return addresses
+
+
+def find_primary_ip(addresses=None):
+    # IPv4 pertama yang valid; IPv6 hanya jika tidak ada IPv4 sama sekali
+    addresses = find_addresses() if addresses is None else addresses
+    for _, ip in addresses:
+        if ip.version == 4:
+            return str(ip)
+    return str(addresses[0][1]) if addresses else 'Not found'
+
+
+def get_mac():
+    try:
+        return ':'.join(['{:02x}'.format((uuid.getnode() >> i) & 0xff)
+                         for i in range(0, 8*6, 8)][::-1])
+    except Exception:
+        return 'Not found'
+
+
+class HostIdentity:
+    """Cache hostname, IP utama, MAC dan status legalitas IP.
+
+    Semua alamat dari ``source`` (default: semua interface lewat psutil) dicek
+    terhadap ``policy`` (ip_policy.IPPolicy); jika ada yang tidak sah, ``ip``
+    berisi alamat tidak sah pertama dan daftar lengkapnya ada di ``violations``. Tanpa policy semua alamat dianggap sah.
+
+    Nilai dihitung ulang hanya setelah ``invalidate()`` (perubahan alamat/link)
+    atau ketika umur cache melewati ``ttl`` detik. ``snapshot()`` pada kondisi
+    normal hanya mengembalikan tuple yang sudah ada.
+    """
+
+    def __init__(self, policy=None, ttl=300, source=find_addresses):
+        self.policy = policy
+        self.source = source
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.info = None
+        self.violations = []  # [(interface, ip), ...]
+        self.mac = None
+        self.expires = 0.0
+
+    def invalidate(self):
+        self.info = None
+
+    def configure(self, policy, ttl):
+        self.policy = policy
+        self.ttl = ttl
+        self.invalidate()
+
+    def refresh(self):
+        with self.lock:
+            hostname = socket.gethostname()
+            addresses = self.source()
+            # MAC tidak berubah selama proses berjalan, cukup dihitung sekali
+            if self.mac is None:
+                self.mac = get_mac()
+            mac = self.mac
+            self.violations = self.policy.violations(addresses) if self.policy else []
+            if self.violations:
+                ip = str(self.violations[0][1])
+            else:
+                ip = find_primary_ip(addresses)
+            self.info = HostInfo(hostname, ip, mac, bool(self.violations))
+            self.expires = time.monotonic() + self.ttl
+            return self.info
+
+    def snapshot(self):
+        info = self.info
+        if info is None or time.monotonic() >= self.expires:
+            return self.refresh()
+        return info
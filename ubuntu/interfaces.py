@@ -0,0 +1,169 @@
+# Built-in modules
+import ipaddress
+import socket
+from collections import namedtuple
+
+# Third-party modules
+import psutil
+
+IFF_UP = 0x1
+
+# addresses: frozenset alamat ipaddress (tanpa loopback dan link-local)
+Interface = namedtuple("Interface", "ifindex name up addresses")
+
+
+def reportable(ip):
+    return not (ip.is_loopback or ip.is_link_local)
+
+
+def read_link_up(name):
+    """Status IFF_UP dari sysfs; False jika interface sudah hilang."""
+    try:
+        with open(f"/sys/class/net/{name}/flags", "r") as f:
+            return bool(int(f.read().strip(), 16) & IFF_UP)
+    except (OSError, ValueError):
+        return False
+
+
+def scan():
+    """State lengkap semua interface: {ifindex: Interface}."""
+    stats = psutil.net_if_stats()
+    entries = {}
+    for name, interface_addresses in psutil.net_if_addrs().items():
+        try:
+            ifindex = socket.if_nametoindex(name)
+        except OSError:
+            continue  # hilang di antara dua panggilan
+        addresses = set()
+        for address in interface_addresses:
+            if address.family not in (socket.AF_INET, socket.AF_INET6):
+                continue
+            try:
+                ip = ipaddress.ip_address(address.address.split("%", 1)[0])
+            except ValueError:
+                continue
+            if reportable(ip):
+                addresses.add(ip)
+        stat = stats.get(name)
+        entries[ifindex] = Interface(ifindex, name, bool(stat and stat.isup), frozenset(addresses))
+    return entries
+
+
+class InterfaceTable:
+    """Alamat dan status link per interface, diindeks ifindex.
+
+    Diisi penuh sekali lewat ``load()`` lalu diperbarui per event (netlink
+    alamat/link, udev ``net``). Setiap method ``apply_*`` mengembalikan True
+    hanya jika entri benar-benar berubah, sehingga kebijakan IP cukup dievaluasi
+    ulang untuk interface itu saja.
+
+    Entri tidak pernah diubah di tempat (namedtuple diganti utuh), jadi
+    ``addresses()`` aman dipanggil dari thread lain.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.reported = {}  # ifindex -> set((interface, ip)) yang sudah di-alert
+
+    def load(self):
+        """Scan ulang semua interface (start, resync); return set ifindex yang berubah."""
+        entries = scan()
+        changed = {i for i in entries.keys() | self.entries.keys()
+                   if entries.get(i) != self.entries.get(i)}
+        self.entries = entries
+        for ifindex in self.reported.keys() - entries.keys():
+            del self.reported[ifindex]
+        return changed
+
+    def _entry(self, ifindex, name=None):
+        entry = self.entries.get(ifindex)
+        if entry is not None:
+            return entry
+        # Event alamat bisa datang lebih dulu dari event udev/link interface-nya
+        if name is None:
+            try:
+                name = socket.if_indextoname(ifindex)
+            except OSError:
+                name = str(ifindex)
+        return Interface(ifindex, name, read_link_up(name), frozenset())
+
+    def _store(self, entry):
+        if self.entries.get(entry.ifindex) == entry:
+            return False
+        self.entries[entry.ifindex] = entry
+        return True
+
+    def _remove(self, ifindex):
+        self.reported.pop(ifindex, None)
+        return self.entries.pop(ifindex, None) is not None
+
+    def apply_address(self, event):
+        """Terapkan ip_watch.AddressEvent ("add"/"remove")."""
+        if not event.address:
+            return False
+        ip = ipaddress.ip_address(event.address)
+        if not reportable(ip):
+            return False
+        if event.action == "remove" and event.ifindex not in self.entries:
+            return False
+        entry = self._entry(event.ifindex)
+        if event.action == "add":
+            addresses = entry.addresses | {ip}
+        else:
+            addresses = entry.addresses - {ip}
+        return self._store(entry._replace(addresses=addresses))
+
+    def apply_link(self, event):
+        """Terapkan ip_watch.LinkEvent (interface baru, flag berubah, atau dihapus)."""
+        if event.action == "remove":
+            return self._remove(event.ifindex)
+        entry = self._entry(event.ifindex, event.name)
+        return self._store(entry._replace(name=event.name or entry.name, up=event.up))
+
+    def apply_udev(self, action, name, ifindex=None):
+        """Terapkan event udev ``net`` (add/remove/move); return ifindex jika berubah."""
+        try:
+            ifindex = int(ifindex) if ifindex else socket.if_nametoindex(name)
+        except (OSError, ValueError):
+            return None
+        if action == "remove":
+            return ifindex if self._remove(ifindex) else None
+        if action not in ("add", "move"):
+            return None
+        entry = self._entry(ifindex, name)
+        # "move" = interface di-rename; rule IP khusus interface bisa ikut berubah
+        changed = self._store(entry._replace(name=name, up=read_link_up(name)))
+        return ifindex if changed else None
+
+    def addresses(self):
+        """``[(interface, ip), ...]`` untuk interface yang link-nya up."""
+        return [(entry.name, ip)
+                for entry in sorted(list(self.entries.values()))
+                if entry.up
+                for ip in sorted(entry.addresses, key=lambda ip: (ip.version, ip))]
+
+    def forget_reported(self):
+        """Kebijakan berubah: semua pelanggaran yang masih ada akan di-alert ulang."""
+        self.reported.clear()
+
+    def evaluate(self, ifindexes, policy):
+        """Cek kebijakan hanya untuk ``ifindexes``.
+
+        Return ``[(entry, new, violations)]`` untuk interface yang punya alamat
+        tidak sah baru sejak alert terakhir. Alamat di link yang down tidak
+        dihitung; saat link naik lagi, pelanggarannya di-alert ulang.
+        """
+        alerts = []
+        for ifindex in sorted(ifindexes):
+            entry = self.entries.get(ifindex)
+            if entry is None:
+                continue
+            violations = []
+            if policy is not None and entry.up:
+                pairs = [(entry.name, ip) for ip in sorted(entry.addresses, key=lambda ip: (ip.version, ip))]
+                violations = policy.violations(pairs)
+            new = [v for v in violations if v not in self.reported.get(ifindex, ())]
+            self.reported[ifindex] = set(violations)
+            if new:
+                alerts.append((entry, new, violations))
+        return alerts
@@ -0,0 +1,117 @@
+# Built-in modules
+import argparse
+import os
+import time
+
+# allow       : perangkat dikenal, tidak pernah di-alert
+# deny        : selalu di-alert
+# notify_once : alert hanya saat pertama kali terlihat di host ini
+POLICIES = ("allow", "deny", "notify_once")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    vendor_id  TEXT NOT NULL,
+    product    TEXT NOT NULL,
+    serial     TEXT NOT NULL,
+    host       TEXT NOT NULL,
+    policy     TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen  REAL NOT NULL,
+    count      INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS devices_key ON devices (vendor_id, product, serial, host);
+"""
+
+
+class Inventory:
+    """Inventaris perangkat USB per host di SQLite, dipakai untuk menekan alert berulang."""
+
+    def __init__(self, path, host, default_policy="notify_once"):
+        if default_policy not in POLICIES:
+            raise ValueError(f"Unknown inventory policy: {default_policy}")
+        self.path = path
+        self.host = host
+        self.default_policy = default_policy
+
+        # sqlite3 di-import di sini supaya config bisa memakai POLICIES tanpa biayanya
+        import sqlite3
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def observe(self, vendor_id, product, serial, now=None):
+        """Catat satu kemunculan perangkat; return True jika perlu di-alert."""
+        now = time.time() if now is None else now
+        key = (vendor_id or "", product or "", serial or "", self.host)
+        row = self.db.execute(
+            "SELECT rowid, policy FROM devices "
+            "WHERE vendor_id = ? AND product = ? AND serial = ? AND host = ?", key
+        ).fetchone()
+
+        if row is None:
+            self.db.execute(
+                "INSERT INTO devices (vendor_id, product, serial, host, policy, first_seen, last_seen, count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 1)", key + (self.default_policy, now, now)
+            )
+            return self.default_policy != "allow"
+
+        rowid, policy = row
+        self.db.execute(
+            "UPDATE devices SET last_seen = ?, count = count + 1 WHERE rowid = ?", (now, rowid)
+        )
+        return policy == "deny"
+
+    def set_policy(self, vendor_id, product, serial, policy, host=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown inventory policy: {policy}")
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO devices (vendor_id, product, serial, host, policy, first_seen, last_seen, count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0) "
+            "ON CONFLICT (vendor_id, product, serial, host) DO UPDATE SET policy = excluded.policy",
+            (vendor_id, product, serial, host or self.host, policy, now, now)
+        )
+
+    def devices(self):
+        return self.db.execute(
+            "SELECT vendor_id, product, serial, host, policy, first_seen, last_seen, count "
+            "FROM devices ORDER BY last_seen DESC"
+        ).fetchall()
+
+
+def main():
+    import socket
+
+    parser = argparse.ArgumentParser(description="Manage the USB device inventory")
+    parser.add_argument("db", help="path to the inventory database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list known devices")
+    for policy in POLICIES:
+        p = sub.add_parser(policy.replace("_", "-"), help=f"set policy '{policy}' for a device")
+        p.add_argument("vendor_id")
+        p.add_argument("product")
+        p.add_argument("serial")
+        p.add_argument("--host", default=socket.gethostname())
+    args = parser.parse_args()
+
+    inventory = Inventory(args.db, socket.gethostname())
+    if args.command == "list":
+        for vendor_id, product, serial, host, policy, first_seen, last_seen, count in inventory.devices():
+            first = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(first_seen))
+            last = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_seen))
+            print(f"{vendor_id}:{product} {serial} host={host} policy={policy} "
+                  f"seen={count} first={first} last={last}")
+    else:
+        inventory.set_policy(args.vendor_id, args.product, args.serial,
+                             args.command.replace("-", "_"), host=args.host)
+    inventory.close()
+
+
+if __name__ == "__main__":
+    main()
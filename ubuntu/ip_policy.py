@@ -0,0 +1,135 @@
+"""Kebijakan alamat IP: daftar CIDR allow/deny, opsional per interface.
+
+Format rule (satu per baris atau dipisah koma)::
+
+    allow 10.1.0.0/16
+    deny  10.1.99.0/24
+    allow fd00::/8 eth0
+
+Rule dengan prefix terpanjang yang cocok menang; jika sama panjang, rule khusus
+interface didahulukan. Alamat yang tidak cocok dengan rule mana pun dianggap
+tidak sah hanya jika ada rule ``allow`` untuk keluarga alamat (IPv4/IPv6) itu.
+"""
+
+# Built-in modules
+import ipaddress
+
+ACTIONS = ("allow", "deny")
+
+
+class PrefixTrie:
+    """Trie biner per bit alamat; lookup prefix terpanjang sepanjang maksimal ``bits`` langkah."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.root = [None, None, None]  # child 0, child 1, (prefixlen, value)
+
+    def insert(self, network, value):
+        node = self.root
+        address = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (address >> (self.bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = (network.prefixlen, value)
+
+    def lookup(self, address):
+        """Return ``(prefixlen, value)`` untuk prefix terpanjang yang cocok, atau None."""
+        node = self.root
+        best = node[2]
+        for i in range(self.bits):
+            node = node[(address >> (self.bits - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                best = node[2]
+        return best
+
+
+def parse_rules(text):
+    """Parse teks rule menjadi list ``(action, network, interface)``."""
+    rules = []
+    for line in text.replace(",", "\n").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        action = "allow"
+        if parts[0].lower() in ACTIONS:
+            action = parts.pop(0).lower()
+        if not parts or len(parts) > 2:
+            raise ValueError(f"Invalid IP policy rule: {line!r}")
+        network = ipaddress.ip_network(parts[0], strict=False)
+        rules.append((action, network, parts[1] if len(parts) == 2 else None))
+    return rules
+
+
+def rules_from_prefix(prefix):
+    """Terjemahkan VALID_IP_PREFIX lama (mis. ``10.1.``) menjadi rule CIDR per oktet."""
+    octets = [octet for octet in prefix.strip().split(".") if octet]
+    if not octets:
+        return []
+    if len(octets) > 4 or not all(octet.isdigit() for octet in octets):
+        raise ValueError(f"Invalid VALID_IP_PREFIX: {prefix!r}")
+    address = ".".join(octets + ["0"] * (4 - len(octets)))
+    return [("allow", ipaddress.ip_network(f"{address}/{8 * len(octets)}"), None)]
+
+
+class IPPolicy:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.tries = {}  # (interface atau None, versi IP) -> PrefixTrie
+        allow_versions = set()
+        for action, network, interface in self.rules:
+            key = (interface, network.version)
+            trie = self.tries.get(key)
+            if trie is None:
+                trie = self.tries[key] = PrefixTrie(network.max_prefixlen)
+            trie.insert(network, action == "allow")
+            if action == "allow":
+                allow_versions.add(network.version)
+        self.default_allow = {4: 4 not in allow_versions, 6: 6 not in allow_versions}
+
+    def __eq__(self, other):
+        return isinstance(other, IPPolicy) and self.rules == other.rules
+
+    def __hash__(self):
+        return hash(tuple(self.rules))
+
+    def allowed(self, address, interface=None):
+        """``address`` berupa string atau objek ipaddress."""
+        if isinstance(address, str):
+            address = ipaddress.ip_address(address.split("%", 1)[0])
+        value = int(address)
+        best = None
+        if interface is not None:
+            trie = self.tries.get((interface, address.version))
+            if trie is not None:
+                best = trie.lookup(value)
+        trie = self.tries.get((None, address.version))
+        if trie is not None:
+            match = trie.lookup(value)
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+        if best is None:
+            return self.default_allow[address.version]
+        return best[1]
+
+    def violations(self, addresses):
+        """Dari ``[(interface, address), ...]``, return yang tidak sah dalam satu lintasan."""
+        return [(interface, address) for interface, address in addresses
+                if not self.allowed(address, interface)]
+
+
+def load_policy(rules_text="", path=None, valid_ip_prefix=""):
+    """Rule dari ``path`` dan ``rules_text``; tanpa keduanya, dari VALID_IP_PREFIX lama."""
+    rules = []
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            rules.extend(parse_rules(f.read()))
+    if rules_text:
+        rules.extend(parse_rules(rules_text))
+    if not path and not rules_text:
+        rules = rules_from_prefix(valid_ip_prefix)
+    return IPPolicy(rules)
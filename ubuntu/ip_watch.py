@@ -0,0 +1,146 @@
+# Built-in modules
+import errno
+import socket
+import struct
+from collections import namedtuple
+
+# Konstanta rtnetlink (lihat linux/rtnetlink.h)
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLMSG_OVERRUN = 4
+
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+IFF_UP = 0x1
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+
+IFLA_IFNAME = 3
+
+NLMSGHDR = struct.Struct("=LHHLL")   # len, type, flags, seq, pid
+IFADDRMSG = struct.Struct("=BBBBI")  # family, prefixlen, flags, scope, index
+IFINFOMSG = struct.Struct("=BxHiII")  # family, type, index, flags, change
+RTATTR = struct.Struct("=HH")        # len, type
+
+# action: "add", "remove" atau "resync" (buffer kernel overflow, event hilang)
+AddressEvent = namedtuple("AddressEvent", "action ifindex family address prefixlen label")
+# action: "add" (interface baru atau flag berubah) atau "remove"
+LinkEvent = namedtuple("LinkEvent", "action ifindex name up")
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _parse_attrs(payload, offset):
+    attrs = {}
+    while offset + RTATTR.size <= len(payload):
+        rta_len, rta_type = RTATTR.unpack_from(payload, offset)
+        if rta_len < RTATTR.size:
+            break
+        attrs[rta_type] = payload[offset + RTATTR.size:offset + rta_len]
+        offset += _align(rta_len)
+    return attrs
+
+
+def _parse_ifinfo(action, payload):
+    _family, _type, ifindex, flags, _change = IFINFOMSG.unpack_from(payload)
+    name = _parse_attrs(payload, IFINFOMSG.size).get(IFLA_IFNAME)
+    if name:
+        name = name.rstrip(b"\0").decode(errors="replace")
+    return LinkEvent(action, ifindex, name, bool(flags & IFF_UP))
+
+
+def _parse_ifaddr(action, payload):
+    family, prefixlen, _flags, _scope, ifindex = IFADDRMSG.unpack_from(payload)
+    attrs = _parse_attrs(payload, IFADDRMSG.size)
+
+    # IFA_LOCAL adalah alamat lokal, IFA_ADDRESS bisa berisi alamat peer (point-to-point)
+    raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+    address = socket.inet_ntop(family, raw) if raw else None
+    label = attrs.get(IFA_LABEL)
+    if label:
+        label = label.rstrip(b"\0").decode(errors="replace")
+    return AddressEvent(action, ifindex, family, address, prefixlen, label)
+
+
+def parse_messages(data):
+    """Pecah satu datagram netlink menjadi daftar AddressEvent/LinkEvent."""
+    events = []
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        msg_len, msg_type, _flags, _seq, _pid = NLMSGHDR.unpack_from(data, offset)
+        if msg_len < NLMSGHDR.size:
+            break
+        payload = data[offset + NLMSGHDR.size:offset + msg_len]
+
+        if msg_type in (RTM_NEWADDR, RTM_DELADDR) and len(payload) >= IFADDRMSG.size:
+            action = "add" if msg_type == RTM_NEWADDR else "remove"
+            events.append(_parse_ifaddr(action, payload))
+        elif msg_type in (RTM_NEWLINK, RTM_DELLINK) and len(payload) >= IFINFOMSG.size:
+            action = "add" if msg_type == RTM_NEWLINK else "remove"
+            events.append(_parse_ifinfo(action, payload))
+        elif msg_type == NLMSG_OVERRUN:
+            events.append(AddressEvent("resync", 0, 0, None, 0, None))
+        elif msg_type == NLMSG_DONE:
+            break
+
+        offset += _align(msg_len)
+    return events
+
+
+class AddressWatcher:
+    """Socket rtnetlink yang menerima notifikasi alamat (IPv4/IPv6) dan link dari kernel.
+
+    Tidak ada polling: proses hanya bangun ketika alamat IP benar-benar berubah.
+    """
+
+    def __init__(self, groups=RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR, bufsize=65536):
+        self.groups = groups
+        self.bufsize = bufsize
+        self.sock = None
+
+    def open(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        try:
+            sock.bind((0, self.groups))
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        return self
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def read_events(self):
+        """Baca semua pesan yang sudah menunggu di socket tanpa blocking."""
+        events = []
+        while True:
+            try:
+                data = self.sock.recv(self.bufsize)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # Kernel membuang event, state harus dicek ulang penuh
+                    events.append(AddressEvent("resync", 0, 0, None, 0, None))
+                    continue
+                raise
+            events.extend(parse_messages(data))
+        return events
@@ -0,0 +1,114 @@
+# Built-in modules
+import queue
+import threading
+from concurrent.futures import Future
+
+# Local modules
+import metrics
+
+EMAILS_SENT = metrics.REGISTRY.counter("usbnotify_emails_sent_total", "Emails delivered to the SMTP relay")
+EMAILS_FAILED = metrics.REGISTRY.counter("usbnotify_emails_failed_total", "Emails that could not be delivered")
+MAIL_QUEUE_DEPTH = metrics.REGISTRY.gauge("usbnotify_mail_queue_depth", "Emails waiting in the sender queue")
+
+
+class MailSender:
+    """Worker tunggal yang mengambil alert dari antrean dan menyerahkannya ke ``delivery``.
+
+    Pengiriman dilakukan dari antrean berukuran tetap, sehingga thread pemanggil
+    (mis. loop udev) tidak pernah menunggu handshake atau round-trip SMTP.
+    ``delivery`` (lihat delivery.Delivery) menjaga sesi tiap transport tetap hidup.
+    """
+
+    def __init__(self, delivery, maxsize=100, keepalive=60, on_failure=None):
+        self.delivery = delivery
+        self.keepalive = keepalive
+        # Dipanggil dengan body email yang gagal dikirim (mis. save_failed_email)
+        self.on_failure = on_failure
+
+        self.queue = queue.Queue(maxsize=maxsize)
+        # Dipegang selama mengirim, supaya delivery tidak ditukar di tengah pengiriman
+        self.lock = threading.Lock()
+        self.thread = None
+        MAIL_QUEUE_DEPTH.callback = self.queue.qsize
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Kirim sisa antrean lalu tutup semua transport."""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def replace_delivery(self, delivery):
+        """Ganti tujuan pengiriman (mis. relay baru setelah reload konfigurasi).
+
+        Menunggu pengiriman yang sedang berjalan selesai; email di antrean
+        dikirim lewat delivery baru.
+        """
+        with self.lock:
+            old, self.delivery = self.delivery, delivery
+        old.close()
+
+    def enqueue(self, subject, body, save_if_failed=True, text=None, required_only=False):
+        """Masukkan email ke antrean tanpa blocking; hasil kirim ada di Future.
+
+        ``body`` adalah HTML; ``text`` (opsional) dikirim sebagai bagian text/plain.
+        ``required_only`` mengirim hanya lewat transport wajib (kirim ulang spool).
+        """
+        future = Future()
+        try:
+            self.queue.put_nowait((subject, body, text, save_if_failed, required_only, future))
+        except queue.Full:
+            print("Mail queue full, email not queued.")
+            EMAILS_FAILED.inc(reason="queue_full")
+            self._failed(body, save_if_failed)
+            future.set_result(False)
+        return future
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.keepalive)
+            except queue.Empty:
+                with self.lock:
+                    self.delivery.keepalive()
+                continue
+
+            if item is None:
+                with self.lock:
+                    self.delivery.close()
+                self.queue.task_done()
+                return
+
+            subject, body, text, save_if_failed, required_only, future = item
+            with self.lock:
+                ok = self._deliver(subject, body, text, required_only)
+            if not ok:
+                self._failed(body, save_if_failed)
+            future.set_result(ok)
+            self.queue.task_done()
+
+    def _failed(self, body, save_if_failed):
+        if save_if_failed and self.on_failure is not None:
+            self.on_failure(body)
+
+    def _deliver(self, subject, body, text=None, required_only=False):
+        try:
+            # Syslog/webhook yang berhasil tidak menggantikan email yang gagal
+            results = self.delivery.deliver(subject, body, text, required_only=required_only)
+            ok = self.delivery.succeeded(results)
+        except Exception as e:
+            print(f"Failed to send email: {e}")
+            ok = False
+        if ok:
+            print("Email sent successfully.")
+            EMAILS_SENT.inc()
+        else:
+            EMAILS_FAILED.inc(reason="delivery")
+        return ok
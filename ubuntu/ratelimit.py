@@ -0,0 +1,102 @@
+# Built-in modules
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket klasik: ``rate`` token per detik, kapasitas ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def available(self, now=None):
+        """Isi ulang token sampai ``now``; True jika ada satu token (belum diambil)."""
+        now = time.monotonic() if now is None else now
+        # Bucket yang baru dibuat bisa lebih baru dari ``now`` milik pemanggil
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return self.tokens >= 1
+
+    def allow(self, now=None):
+        if self.available(now):
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AlertLimiter:
+    """Batasi alert keluar secara global dan per host, plus debounce per perangkat.
+
+    Alert yang ditahan dihitung per host dan dilaporkan lewat ``take_suppressed``
+    pada alert berikutnya yang lolos.
+    """
+
+    def __init__(self, global_rate, global_burst, host_rate, host_burst, debounce=30.0,
+                 max_devices=4096):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.debounce_window = debounce
+        self.max_devices = max_devices
+
+        self.lock = threading.Lock()
+        self.host_buckets = {}
+        self.last_seen = {}   # device key -> monotonic
+        self.suppressed = {}  # host -> jumlah alert/event yang ditahan
+
+    def configure(self, global_rate, global_burst, host_rate, host_burst, debounce):
+        """Ubah batas saat konfigurasi di-reload; token yang tersisa dipertahankan."""
+        with self.lock:
+            self.global_bucket.rate = global_rate
+            self.global_bucket.burst = global_burst
+            self.host_rate = host_rate
+            self.host_burst = host_burst
+            for bucket in self.host_buckets.values():
+                bucket.rate = host_rate
+                bucket.burst = host_burst
+            self.debounce_window = debounce
+
+    def debounce(self, host, key, now=None):
+        """Return False jika perangkat yang sama muncul lagi di host yang sama dalam jendela debounce."""
+        now = time.monotonic() if now is None else now
+        # Per host: di collector, perangkat yang pindah ke host lain tetap di-alert
+        key = (host, key)
+        with self.lock:
+            last = self.last_seen.get(key)
+            self.last_seen[key] = now
+            if len(self.last_seen) > self.max_devices:
+                self._prune(now)
+            if last is not None and now - last < self.debounce_window:
+                self.suppressed[host] = self.suppressed.get(host, 0) + 1
+                return False
+            return True
+
+    def acquire(self, host, count=1, now=None):
+        """Ambil satu token untuk satu email; ``count`` event dihitung jika ditolak."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            bucket = self.host_buckets.get(host)
+            if bucket is None:
+                bucket = self.host_buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+            # Token baru diambil jika kedua bucket punya: saat batas global menahan,
+            # host tidak kehilangan token untuk alert yang tidak pernah terkirim
+            # (dan sebaliknya host yang ramai tidak menghabiskan token global)
+            if bucket.available(now) and self.global_bucket.available(now):
+                bucket.tokens -= 1
+                self.global_bucket.tokens -= 1
+                return True
+            self.suppressed[host] = self.suppressed.get(host, 0) + count
+            return False
+
+    def take_suppressed(self, host):
+        with self.lock:
+            return self.suppressed.pop(host, 0)
+
+    def _prune(self, now):
+        expired = [key for key, t in self.last_seen.items() if now - t >= self.debounce_window]
+        for key in expired:
+            del self.last_seen[key]
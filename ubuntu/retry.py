@@ -0,0 +1,105 @@
+# Built-in modules
+import random
+import time
+
+# Local modules
+import metrics
+
+RESEND_ATTEMPTS = metrics.REGISTRY.counter("usbnotify_resend_attempts_total", "Spool resend attempts by result")
+RESEND_BACKOFF_SECONDS = metrics.REGISTRY.gauge("usbnotify_resend_backoff_seconds", "Delay until the next spool resend attempt")
+
+
+class RetryScheduler:
+    """Kirim ulang isi spool hanya jika ada isinya, dengan backoff eksponensial + jitter.
+
+    Tidak ada timer selama spool kosong; ``notify`` (dipanggil saat email masuk
+    spool, boleh dari thread mana pun) menjadwalkan percobaan berikutnya.
+    Sebelum menguras spool, ``probe`` dipanggil untuk mengecek relay secara murah.
+    ``drain`` mengembalikan True jika semua isi spool berhasil terkirim.
+
+    Jeda ke-n adalah ``min_delay * 2**n`` (maksimal ``max_delay``), diacak antara
+    setengah dan penuh supaya host-host tidak mencoba ulang bersamaan.
+    """
+
+    def __init__(self, loop, pending, probe, drain, min_delay=30.0, max_delay=3600.0):
+        self.loop = loop
+        self.pending = pending
+        self.probe = probe
+        self.drain = drain
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self.failures = 0
+        self.timer = None
+        self.running = False
+        self.closed = False
+
+    def start(self):
+        # Sisa spool dari run sebelumnya: percobaan pertama juga diberi jitter
+        if self.pending():
+            self._schedule()
+        return self
+
+    def notify(self):
+        """Tandai ada email baru di spool. Aman dipanggil dari thread lain."""
+        if self.closed or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._schedule)
+
+    def cancel(self):
+        self.closed = True
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def next_delay(self):
+        delay = min(self.max_delay, self.min_delay * (2 ** self.failures))
+        return random.uniform(delay / 2, delay)
+
+    def _schedule(self):
+        # Satu timer saja; percobaan yang sedang berjalan menjadwalkan dirinya sendiri
+        if self.closed or self.timer is not None or self.running:
+            return
+        delay = self.next_delay()
+        RESEND_BACKOFF_SECONDS.set(delay)
+        self.timer = self.loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self.timer = None
+        self.running = True
+        self.loop.create_task(self._attempt())
+
+    async def _attempt(self):
+        try:
+            # probe dan drain melakukan I/O jaringan, jadi dijalankan di executor
+            ok = await self.loop.run_in_executor(None, self._run_once)
+        except Exception as e:
+            print(f"Error resending failed emails: {e}")
+            ok = False
+        finally:
+            self.running = False
+
+        if ok:
+            self.failures = 0
+            RESEND_BACKOFF_SECONDS.set(0)
+        else:
+            self.failures += 1
+        if self.pending():
+            self._schedule()
+
+    def _run_once(self):
+        if not self.pending():
+            return True
+        start = time.monotonic()
+        if not self.probe():
+            RESEND_ATTEMPTS.inc(result="relay_down")
+            print(f"Mail relay unreachable, next resend attempt in ~{self.next_delay_hint():.0f}s.")
+            return False
+        ok = self.drain()
+        RESEND_ATTEMPTS.inc(result="ok" if ok else "failed")
+        print(f"Spool resend {'finished' if ok else 'interrupted'} in {time.monotonic() - start:.1f}s.")
+        return ok
+
+    def next_delay_hint(self):
+        # Perkiraan jeda setelah kegagalan ini (tanpa jitter)
+        return min(self.max_delay, self.min_delay * (2 ** (self.failures + 1)))
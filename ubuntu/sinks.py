@@ -0,0 +1,149 @@
+# Built-in modules
+import datetime
+import json
+import os
+import threading
+import time
+
+
+class Sink:
+    """Tujuan event terstruktur (dict). Subclass minimal mengimplementasikan ``emit``."""
+
+    def emit(self, event):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class EmailSink(Sink):
+    """Teruskan event ke jalur email: USB lewat batcher, IP tidak sah langsung dikirim.
+
+    Jika ``limiter`` diberikan, perangkat yang muncul berulang dalam jendela
+    debounce tidak diteruskan ke batcher.
+    """
+
+    def __init__(self, batcher, send_ip_alert, limiter=None):
+        self.batcher = batcher
+        self.send_ip_alert = send_ip_alert
+        self.limiter = limiter
+
+    def emit(self, event):
+        if event["type"] == "usb_detach":
+            self.batcher.add(event["hostname"], (event["serial"], event["action"]), event)
+        elif event["type"] == "usb_attach":
+            if self.limiter is not None and not self.limiter.debounce(event["hostname"], event["serial"]):
+                print(f"Device {event['serial']} re-attached within debounce window, not alerted.")
+                return
+            # Event hub/composite yang datang bersamaan digabung jadi satu email
+            if not self.batcher.add(event["hostname"], (event["serial"], event["action"]), event):
+                print(f"Duplicate event for {event['serial']} ignored.")
+        elif event["type"] == "illegal_ip":
+            self.send_ip_alert(event)
+
+    def flush(self):
+        self.batcher.flush_all()
+
+
+class JsonLinesSink(Sink):
+    """Log event JSON-lines dengan buffer, rotasi berdasarkan ukuran/umur, dan gzip opsional.
+
+    Baris ditahan di memori paling lama ``flush_interval`` detik atau sampai
+    ``max_buffer`` baris, lalu ditulis dalam satu ``write``.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, max_age=86400, compress=True,
+                 flush_interval=1.0, max_buffer=256, loop=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.loop = loop
+
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.file = None
+        self.opened_at = 0.0
+        self.timer_pending = False
+
+    def emit(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            self.buffer.append(line)
+            if len(self.buffer) >= self.max_buffer:
+                self._write()
+                return
+            if not self.timer_pending:
+                self.timer_pending = True
+                self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self.loop is not None:
+            self.loop.call_later(self.flush_interval, self.flush)
+        else:
+            timer = threading.Timer(self.flush_interval, self.flush)
+            timer.daemon = True
+            timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.timer_pending = False
+            self._write()
+
+    def close(self):
+        with self.lock:
+            self._write()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def _open(self):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+            self.opened_at = time.time()
+        return self.file
+
+    def _write(self):
+        if not self.buffer:
+            return
+        f = self._open()
+        f.write("".join(self.buffer))
+        f.flush()
+        self.buffer = []
+
+        if (f.tell() >= self.max_bytes or
+                (self.max_age and time.time() - self.opened_at >= self.max_age)):
+            self._rotate()
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        rotated = f"{self.path}.{stamp}"
+        n = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{self.path}.{stamp}.{n}"
+            n += 1
+        os.replace(self.path, rotated)
+
+        if self.compress:
+            # Kompresi di thread terpisah supaya emit tidak ikut menunggu
+            threading.Thread(target=_gzip_file, args=(rotated,), daemon=True).start()
+
+
+def _gzip_file(path):
+    import gzip
+    import shutil
+
+    try:
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+    except Exception as e:
+        print(f"Error compressing {path}: {e}")
@@ -0,0 +1,240 @@
+# Built-in modules
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Header record: panjang payload + CRC32 payload (big-endian)
+RECORD_HEADER = struct.Struct(">II")
+COPY_CHUNK = 1024 * 1024
+# Batas satu record: panjang di atas ini berarti header rusak, bukan email sungguhan
+MAX_RECORD = 16 * 1024 * 1024
+
+
+def read_header(f, remaining):
+    """Baca header record; None jika tidak lengkap atau panjangnya mustahil.
+
+    ``remaining`` = sisa byte file dari posisi header. Panjang tidak dipercaya
+    begitu saja: satu bit yang terbalik tidak boleh membuat ``read`` meminta
+    sampai 4 GiB.
+    """
+    header = f.read(RECORD_HEADER.size)
+    if len(header) < RECORD_HEADER.size:
+        return None
+    length, crc = RECORD_HEADER.unpack(header)
+    if length > MAX_RECORD or length > remaining - RECORD_HEADER.size:
+        return None
+    return length, crc
+
+
+class Spool:
+    """Antrean append-only di disk untuk email yang gagal dikirim.
+
+    Semua record ada di satu file (``<name>.spool``), masing-masing diawali
+    panjang dan CRC. Offset record yang sudah terkirim disimpan terpisah di
+    ``<name>.ckpt`` sehingga replay bisa dilanjutkan tanpa mengirim ulang.
+
+    fsync dikelompokkan per ``fsync_every`` record, tetapi record tidak pernah
+    menunggu lebih dari ``fsync_interval`` detik: timer deadline memanggil
+    ``sync`` jika tidak ada append berikutnya.
+
+    Record terakhir yang terpotong (crash di tengah append) dibuang saat spool
+    pertama kali dibuka, supaya append berikutnya tidak tertulis di belakangnya
+    dan replay tidak macet di sana.
+    """
+
+    def __init__(self, directory, name="failed_emails", fsync_every=16, fsync_interval=1.0):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.spool")
+        self.checkpoint_path = os.path.join(directory, f"{name}.ckpt")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self.lock = threading.Lock()
+        self.file = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.sync_timer = None
+        self.recovered = False
+
+    # --- Penulisan ---
+
+    def _recover(self):
+        """Potong ekor file yang bukan record utuh; hanya sekali per proses."""
+        if self.recovered:
+            return
+        self.recovered = True
+        try:
+            f = open(self.path, "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            end = os.fstat(f.fileno()).st_size
+            offset = self.checkpoint()
+            if offset > end:
+                print(f"Spool checkpoint {offset} is past end of file ({end}); resetting")
+                offset = end
+                self.ack(end)
+            f.seek(offset)
+            while offset < end:
+                record = read_header(f, end - offset)
+                if record is None:
+                    break
+                offset += RECORD_HEADER.size + record[0]
+                f.seek(offset)
+            if offset < end:
+                print(f"Truncating torn spool record at offset {offset} ({end - offset} bytes)")
+                f.truncate(offset)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _open(self):
+        if self.file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._recover()
+            self.file = open(self.path, "ab")
+        return self.file
+
+    def append(self, body):
+        payload = body.encode("utf-8")
+        if len(payload) > MAX_RECORD:
+            raise ValueError(f"Spool record too large: {len(payload)} bytes")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            f = self._open()
+            f.write(record)
+            f.flush()
+            self.unsynced += 1
+            # fsync dikelompokkan: per N record atau per interval, bukan tiap append
+            if (self.unsynced >= self.fsync_every or
+                    time.monotonic() - self.last_sync >= self.fsync_interval):
+                self._sync()
+            elif self.sync_timer is None:
+                # Burst pendek yang berhenti di sini tetap di-fsync paling lambat fsync_interval
+                delay = max(self.last_sync + self.fsync_interval - time.monotonic(), 0)
+                self.sync_timer = threading.Timer(delay, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        if self.sync_timer is not None:
+            # cancel() dari dalam callback timer sendiri tidak berbahaya
+            self.sync_timer.cancel()
+            self.sync_timer = None
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    # --- Checkpoint ---
+
+    def checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def ack(self, offset):
+        """Tandai semua record sebelum ``offset`` sudah terkirim."""
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    # --- Pembacaan ---
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def pending_bytes(self):
+        return max(self.size() - self.checkpoint(), 0)
+
+    def iter_batches(self, max_bytes=256 * 1024):
+        """Yield ``(bodies, end_offset)`` mulai dari checkpoint, tiap batch <= max_bytes.
+
+        Hanya satu batch yang ada di memori pada satu waktu.
+        """
+        with self.lock:
+            self._recover()
+            if self.file is not None:
+                self.file.flush()
+
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            offset = self.checkpoint()
+            f.seek(offset)
+            bodies, size = [], 0
+            while True:
+                record = read_header(f, os.fstat(f.fileno()).st_size - offset)
+                if record is None:
+                    break  # Akhir file (ekor terpotong sudah dibuang oleh _recover)
+                length, crc = record
+                payload = f.read(length)
+                if len(payload) < length:
+                    break
+
+                next_offset = offset + RECORD_HEADER.size + length
+                if zlib.crc32(payload) != crc:
+                    print(f"Skipping corrupt spool record at offset {offset}")
+                    offset = next_offset
+                    continue
+
+                if bodies and size + length > max_bytes:
+                    yield bodies, offset
+                    bodies, size = [], 0
+                bodies.append(payload.decode("utf-8", errors="replace"))
+                size += length
+                offset = next_offset
+
+            if bodies:
+                yield bodies, offset
+
+    # --- Kompaksi ---
+
+    def compact(self):
+        """Buang record yang sudah di-ack dari awal file spool."""
+        with self.lock:
+            offset = self.checkpoint()
+            if not offset:
+                return
+            self._sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+            tmp = self.path + ".tmp"
+            with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+                src.seek(offset)
+                while True:
+                    chunk = src.read(COPY_CHUNK)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+            # Checkpoint direset lebih dulu: jika crash sebelum replace, record
+            # lama hanya terkirim ulang, tidak ada yang hilang
+            self.ack(0)
+            os.replace(tmp, self.path)
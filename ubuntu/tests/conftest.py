@@ -0,0 +1,5 @@
+# Modul agent berada satu direktori di atas dan saling import dengan nama datar
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,129 @@
+# Built-in modules
+import asyncio
+import socket
+import threading
+import time
+
+# Third-party modules
+import pytest
+
+# Local modules
+import collector
+
+
+def test_batch_roundtrip():
+    events = [
+        {"type": "usb_attach", "serial": "ABC123", "name": "Disk é", "ip": None},
+        {"custom": "x" * 300, "hostname": "host-1"},
+        {},
+    ]
+    assert collector.decode_batch(collector.encode_batch(events)) == events
+
+
+def test_unknown_field_id_from_newer_agent_is_kept():
+    body = collector.U16.pack(1) + collector.U8.pack(1) + collector.U8.pack(200) + collector.U16.pack(2) + b"ok"
+    assert collector.decode_batch(body) == [{"field_200": "ok"}]
+
+
+@pytest.mark.parametrize("body", [
+    b"",
+    b"\x00",
+    collector.U16.pack(2) + collector.encode_event({"type": "x"}),
+    collector.encode_batch([{"type": "x"}]) + b"junk",
+])
+def test_malformed_batch_raises_protocol_error(body):
+    with pytest.raises(collector.ProtocolError):
+        collector.decode_batch(body)
+
+
+def test_header_rejects_other_versions_and_oversized_frames():
+    frame = collector.encode_frame(collector.ACK, 7)
+    assert collector.decode_header(frame[:collector.HEADER.size]) == (0, collector.ACK, 7)
+    with pytest.raises(collector.ProtocolError):
+        collector.decode_header(collector.HEADER.pack(6, 1, collector.ACK, 7))
+    with pytest.raises(collector.ProtocolError):
+        collector.decode_header(collector.HEADER.pack(collector.MAX_FRAME + 7, collector.VERSION, collector.BATCH, 1))
+
+
+class RunningServer:
+    def __init__(self, secret=None):
+        self.events = []
+        self.server = collector.CollectorServer(self.events.append, secret=secret)
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        async def start():
+            self.tcp = await asyncio.start_server(self.server.handle, "127.0.0.1", 0)
+            self.address = "127.0.0.1:%d" % self.tcp.sockets[0].getsockname()[1]
+            ready.set()
+
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(start(), self.loop)
+        ready.wait(5)
+
+    def wait_for(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(self.events) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.events
+
+    def stop(self):
+        async def stop():
+            self.tcp.close()
+            await self.server.close()
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+@pytest.fixture
+def secret_server():
+    server = RunningServer(secret="s3cret")
+    yield server
+    server.stop()
+
+
+def test_agent_with_shared_secret_is_accepted(secret_server):
+    client = collector.CollectorClient(secret_server.address, "host-1", max_delay=0.01, secret="s3cret").start()
+    client.send({"type": "usb_attach", "serial": "A1"})
+    assert secret_server.wait_for(1) == [{"type": "usb_attach", "serial": "A1", "hostname": "host-1"}]
+    client.close(timeout=1)
+
+
+def test_agent_with_wrong_secret_is_refused(secret_server):
+    client = collector.CollectorClient(secret_server.address, "intruder", max_delay=0.01, secret="guess").start()
+    client.send({"type": "usb_attach", "serial": "EVIL"})
+    time.sleep(0.3)
+    client.close(timeout=0.2)
+    assert secret_server.events == []
+    assert client.pending
+
+
+def read_frame(sock):
+    header = b""
+    while len(header) < collector.HEADER.size:
+        header += sock.recv(collector.HEADER.size - len(header))
+    body_length, kind, seq = collector.decode_header(header)
+    body = b""
+    while len(body) < body_length:
+        body += sock.recv(body_length - len(body))
+    return kind, seq, body
+
+
+def test_undecodable_batch_is_rejected_and_connection_continues():
+    server = RunningServer()
+    try:
+        host, port = collector.parse_address(server.address)
+        with socket.create_connection((host, port), timeout=5) as sock:
+            kind, _, nonce = read_frame(sock)
+            assert kind == collector.CHALLENGE
+            sock.sendall(collector.encode_frame(
+                collector.HELLO, 0, collector.HELLO_BODY.pack(1, bytes(32)) + b"host-2"))
+            sock.sendall(collector.encode_frame(collector.BATCH, 1, b""))
+            assert read_frame(sock)[:2] == (collector.REJECT, 1)
+            sock.sendall(collector.encode_frame(collector.BATCH, 2, collector.encode_batch([{"serial": "B2"}])))
+            assert read_frame(sock)[:2] == (collector.ACK, 2)
+        assert server.wait_for(1) == [{"serial": "B2", "hostname": "host-2"}]
+    finally:
+        server.stop()
@@ -0,0 +1,65 @@
+# Built-in modules
+import os
+
+# Third-party modules
+import pytest
+
+# Local modules
+import config
+
+
+def test_defaults_are_parsed():
+    cfg = config.build({"EMAIL_PORT": "2525", "TO_EMAIL": "a@example.com, b@example.com"})
+    assert cfg.email_port == 2525
+    assert cfg.recipients == ("a@example.com", "b@example.com")
+    assert cfg.inventory_default_policy == "notify_once"
+
+
+@pytest.mark.parametrize("env", [
+    {"INVENTORY_DEFAULT_POLICY": "notifyonce"},
+    {"EMAIL_PORT": "abc"},
+    {"IP_POLICY": "allow 10.0.0.0/33"},
+    {"SMTP_KEEPALIVE": "0"},
+    {"SMTP_KEEPALIVE": "-5"},
+    {"SMTP_TIMEOUT": "0"},
+    {"RESEND_BACKOFF_MIN": "0"},
+    {"RESEND_BACKOFF_MIN": "600", "RESEND_BACKOFF_MAX": "60"},
+    {"ALERT_BATCH_SIZE": "0"},
+    {"MAIL_QUEUE_SIZE": "0"},
+    {"ALERT_RATE_HOST": "-1"},
+])
+def test_invalid_values_are_rejected(env):
+    with pytest.raises(config.ConfigError):
+        config.build(env)
+
+
+def test_zero_is_allowed_where_it_means_disabled():
+    cfg = config.build({"DEVICE_DEBOUNCE": "0", "EVENT_LOG_MAX_AGE": "0", "ALERT_BATCH_DELAY": "0"})
+    assert (cfg.device_debounce, cfg.event_log_max_age, cfg.alert_batch_delay) == (0, 0, 0)
+
+
+def test_watcher_sees_env_and_policy_file(tmp_path):
+    env_dir, policy_dir = tmp_path / "etc", tmp_path / "policy"
+    env_dir.mkdir()
+    policy_dir.mkdir()
+    watcher = config.EnvFileWatcher(str(env_dir / ".env"), str(policy_dir / "ip.rules")).open()
+    try:
+        (policy_dir / "other").write_text("x")
+        assert not watcher.read_changed()
+        # Editor menulis file baru lalu rename
+        (policy_dir / "ip.rules.tmp").write_text("allow 10.0.0.0/8\n")
+        os.replace(policy_dir / "ip.rules.tmp", policy_dir / "ip.rules")
+        assert watcher.read_changed()
+        (env_dir / ".env").write_text("HOST_INFO_TTL=5\n")
+        assert watcher.read_changed()
+    finally:
+        watcher.close()
+
+
+def test_policy_file_is_part_of_the_snapshot(tmp_path):
+    rules = tmp_path / "ip.rules"
+    rules.write_text("allow 10.0.0.0/8\n")
+    old = config.build({"IP_POLICY_FILE": str(rules)})
+    rules.write_text("allow 192.168.0.0/16\n")
+    new = config.build({"IP_POLICY_FILE": str(rules)})
+    assert config.changed_fields(old, new) == {"ip_policy"}
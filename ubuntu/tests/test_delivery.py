@@ -0,0 +1,145 @@
+# Built-in modules
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Third-party modules
+import pytest
+
+# Local modules
+import delivery
+
+
+class StubWebhook:
+    """Server HTTP lokal yang mencatat setiap POST dan membalas dengan ``status``."""
+
+    def __init__(self, status=204):
+        self.status = status
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                stub.requests.append((self.headers["Content-Type"], json.loads(self.rfile.read(length))))
+                self.send_response(stub.status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeRelay:
+    """Pengganti SMTPRelay: ``delay`` detik lalu berhasil, atau hang sampai timeout."""
+
+    def __init__(self, host, delay=0.0, hang=False):
+        self.host = host
+        self.delay = delay
+        self.hang = hang
+        self.timeouts = []
+        self.sent = []
+
+    def sendmail(self, from_addr, recipients, message, timeout=None):
+        self.timeouts.append(timeout)
+        if self.hang:
+            time.sleep(timeout)
+            raise TimeoutError(f"{self.host} timed out")
+        time.sleep(self.delay)
+        self.sent.append(message)
+
+    def probe(self):
+        return not self.hang
+
+    def noop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+class FailingTransport(delivery.Transport):
+    name = "smtp"
+    required = True
+
+    def send(self, subject, html, text=None, deadline=None, cancelled=None):
+        raise RuntimeError("relay down")
+
+    def probe(self):
+        return False
+
+
+def smtp_transport(relays, timeout):
+    return delivery.SMTPTransport(relays, "agent@example.com", ["ops@example.com"], timeout=timeout)
+
+
+def test_webhook_posts_json_to_stub_server():
+    with StubWebhook() as stub:
+        transport = delivery.WebhookTransport(stub.url, timeout=5)
+        transport.send("Subject", "<p>html</p>", "text")
+        assert transport.probe()
+    assert stub.requests == [("application/json", {"subject": "Subject", "text": "text", "html": "<p>html</p>"})]
+
+
+def test_webhook_http_error_is_a_failure():
+    with StubWebhook(status=500) as stub:
+        result = delivery.Delivery([delivery.WebhookTransport(stub.url, timeout=5)]).deliver("s", "h")
+    assert result == {"webhook": False}
+
+
+def test_webhook_success_does_not_replace_failed_smtp():
+    with StubWebhook() as stub:
+        fanout = delivery.Delivery([FailingTransport(), delivery.WebhookTransport(stub.url, timeout=5)])
+        results = fanout.deliver("s", "h")
+        assert results == {"smtp": False, "webhook": True}
+        assert not fanout.succeeded(results)
+        # Probe sebelum menguras spool hanya melihat relay SMTP
+        assert not fanout.probe()
+        # Kirim ulang spool tidak menyentuh webhook lagi
+        assert fanout.deliver("s", "h", required_only=True) == {"smtp": False}
+    assert len(stub.requests) == 1
+
+
+def test_hung_primary_relay_leaves_time_for_fallback():
+    primary, fallback = FakeRelay("primary", hang=True), FakeRelay("fallback")
+    transport = smtp_transport([primary, fallback], timeout=0.5)
+    results = delivery.Delivery([transport]).deliver("s", "h")
+    assert results == {"smtp": True}
+    assert len(fallback.sent) == 1
+    # Jatah waktu dibagi rata: relay utama tidak memakai seluruh deadline transport
+    assert primary.timeouts[0] == pytest.approx(0.5, abs=0.05)
+
+
+def test_timed_out_transport_is_cancelled_and_skipped():
+    relay = FakeRelay("slow", delay=0.6)
+    transport = smtp_transport([relay], timeout=0.1)
+    fanout = delivery.Delivery([transport])
+    fanout.GRACE = 0.0
+    assert fanout.deliver("s", "h") == {"smtp": False}
+    # Pengiriman sebelumnya masih berjalan: tidak diantrekan di belakangnya
+    assert fanout.deliver("s", "h") == {"smtp": False}
+    time.sleep(0.7)
+    assert len(relay.sent) == 1
+    fanout.close()
+
+
+def test_cancelled_send_does_not_try_fallback_relay():
+    primary, fallback = FakeRelay("primary", hang=True), FakeRelay("fallback")
+    transport = smtp_transport([primary, fallback], timeout=0.2)
+    cancelled = threading.Event()
+    cancelled.set()
+    with pytest.raises(RuntimeError, match="cancelled"):
+        transport.send("s", "h", cancelled=cancelled)
+    assert primary.timeouts == [] and fallback.sent == []
@@ -0,0 +1,91 @@
+# Built-in modules
+import ipaddress
+import socket
+
+# Third-party modules
+import pytest
+
+# Local modules
+import interfaces
+import ip_policy
+import ip_watch
+
+POLICY = ip_policy.IPPolicy(ip_policy.parse_rules("allow 10.1.0.0/16"))
+
+
+def address(action, ifindex, ip):
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    return ip_watch.AddressEvent(action, ifindex, family, ip, 24, None)
+
+
+def link(action, ifindex, name, up=True):
+    return ip_watch.LinkEvent(action, ifindex, name, up)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    # Tanpa sysfs: semua link dianggap up kecuali diubah lewat LinkEvent
+    monkeypatch.setattr(interfaces, "read_link_up", lambda name: True)
+    table = interfaces.InterfaceTable()
+    table.apply_link(link("add", 2, "eth0"))
+    table.apply_address(address("add", 2, "10.1.0.5"))
+    table.apply_link(link("add", 3, "usb0"))
+    return table
+
+
+def test_new_violation_on_second_nic_alerts_once(table):
+    assert table.evaluate({2, 3}, POLICY) == []
+    assert table.apply_address(address("add", 3, "192.168.42.10"))
+    alerts = table.evaluate({3}, POLICY)
+    assert [(entry.name, new) for entry, new, _ in alerts] == [
+        ("usb0", [("usb0", ipaddress.ip_address("192.168.42.10"))])]
+    # Evaluasi ulang tanpa perubahan: pelanggaran yang sama tidak di-alert lagi
+    assert table.evaluate({2, 3}, POLICY) == []
+
+
+def test_unchanged_entry_is_not_reported_as_changed(table):
+    assert not table.apply_address(address("add", 2, "10.1.0.5"))
+    assert not table.apply_link(link("add", 2, "eth0"))
+    # Loopback dan link-local tidak pernah masuk tabel
+    assert not table.apply_address(address("add", 2, "127.0.0.1"))
+    assert not table.apply_address(address("add", 2, "fe80::1"))
+    # Hapus alamat dari interface yang tidak dikenal tidak membuat entri baru
+    assert not table.apply_address(address("remove", 9, "10.1.0.9"))
+
+
+def test_link_down_then_up_realerts(table):
+    table.apply_address(address("add", 3, "192.168.42.10"))
+    assert len(table.evaluate({3}, POLICY)) == 1
+    assert table.apply_link(link("add", 3, "usb0", up=False))
+    assert table.evaluate({3}, POLICY) == []
+    assert ("usb0", ipaddress.ip_address("192.168.42.10")) not in table.addresses()
+    assert table.apply_link(link("add", 3, "usb0", up=True))
+    assert len(table.evaluate({3}, POLICY)) == 1
+
+
+def test_udev_move_renames_entry(table):
+    table.apply_address(address("add", 3, "192.168.42.10"))
+    assert table.apply_udev("move", "enx0011", ifindex="3") == 3
+    assert table.entries[3].name == "enx0011"
+    assert table.entries[3].addresses == {ipaddress.ip_address("192.168.42.10")}
+    # Rule khusus nama interface baru berlaku setelah rename
+    policy = ip_policy.IPPolicy(ip_policy.parse_rules("allow 10.1.0.0/16, allow 192.168.42.0/24 enx0011"))
+    assert table.evaluate({3}, policy) == []
+    assert table.apply_udev("move", "enx0011", ifindex="3") is None
+
+
+def test_udev_remove_forgets_entry_and_reported(table):
+    table.apply_address(address("add", 3, "192.168.42.10"))
+    table.evaluate({3}, POLICY)
+    assert table.apply_udev("remove", "usb0", ifindex="3") == 3
+    assert 3 not in table.entries and 3 not in table.reported
+    assert table.apply_udev("remove", "usb0", ifindex="3") is None
+
+
+def test_load_diffs_against_previous_state(table, monkeypatch):
+    eth0 = table.entries[2]
+    usb1 = interfaces.Interface(4, "usb1", True, frozenset({ipaddress.ip_address("172.16.0.2")}))
+    monkeypatch.setattr(interfaces, "scan", lambda: {2: eth0, 4: usb1})
+    # usb0 hilang, usb1 baru, eth0 tidak berubah
+    assert table.load() == {3, 4}
+    assert table.load() == set()
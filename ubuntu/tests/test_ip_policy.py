@@ -0,0 +1,69 @@
+# Built-in modules
+import ipaddress
+
+# Third-party modules
+import pytest
+
+# Local modules
+import ip_policy
+
+
+def policy(text):
+    return ip_policy.IPPolicy(ip_policy.parse_rules(text))
+
+
+def test_longest_prefix_wins():
+    rules = policy("allow 10.1.0.0/16, deny 10.1.99.0/24, allow 10.1.99.7/32")
+    assert rules.allowed("10.1.2.3")
+    assert not rules.allowed("10.1.99.8")
+    assert rules.allowed("10.1.99.7")
+    assert not rules.allowed("10.2.0.1")
+
+
+def test_interface_rule_wins_tie_with_global_rule():
+    rules = policy("deny 192.168.7.0/24\nallow 192.168.7.0/24 usb0")
+    assert rules.allowed("192.168.7.2", "usb0")
+    assert not rules.allowed("192.168.7.2", "eth0")
+    assert not rules.allowed("192.168.7.2")
+    # Rule global yang lebih spesifik tetap menang atas rule interface yang lebih umum
+    rules = policy("allow 192.168.0.0/16 usb0, deny 192.168.7.0/24")
+    assert not rules.allowed("192.168.7.2", "usb0")
+
+
+def test_legacy_prefix_matches_whole_octets_only():
+    rules = ip_policy.load_policy(valid_ip_prefix="10.1.")
+    assert rules.allowed("10.1.200.3")
+    assert not rules.allowed("10.10.0.1")
+    assert not rules.allowed("10.100.0.1")
+    assert ip_policy.rules_from_prefix("10.1") == [("allow", ipaddress.ip_network("10.1.0.0/16"), None)]
+
+
+@pytest.mark.parametrize("prefix", ["10.a.", "1.2.3.4.5", "300.1."])
+def test_invalid_legacy_prefix_is_rejected(prefix):
+    with pytest.raises(ValueError):
+        ip_policy.rules_from_prefix(prefix)
+
+
+def test_default_allow_is_per_ip_version():
+    rules = policy("allow 10.0.0.0/8")
+    assert not rules.allowed("172.16.0.1")
+    assert rules.allowed("2001:db8::1")
+    rules = policy("allow fd00::/8")
+    assert rules.allowed("172.16.0.1")
+    assert not rules.allowed("2001:db8::1")
+    assert rules.allowed("fd00::1%eth0")
+    # Tanpa rule sama sekali semua alamat sah
+    assert ip_policy.load_policy().allowed("8.8.8.8")
+
+
+def test_violations_lists_every_unauthorized_address():
+    rules = policy("allow 10.0.0.0/8")
+    addresses = [("eth0", ipaddress.ip_address("10.0.0.5")), ("usb0", ipaddress.ip_address("192.168.42.9"))]
+    assert rules.violations(addresses) == [addresses[1]]
+
+
+def test_malformed_rule_is_rejected():
+    with pytest.raises(ValueError):
+        ip_policy.parse_rules("allow")
+    with pytest.raises(ValueError):
+        ip_policy.parse_rules("allow 10.0.0.0/8 eth0 extra")
@@ -0,0 +1,50 @@
+# Built-in modules
+import socket
+
+# Local modules
+import ip_watch
+
+
+def rtattr(kind, value):
+    length = ip_watch.RTATTR.size + len(value)
+    return ip_watch.RTATTR.pack(length, kind) + value + b"\0" * (ip_watch._align(length) - length)
+
+
+def nlmsg(kind, payload=b""):
+    length = ip_watch.NLMSGHDR.size + len(payload)
+    return (ip_watch.NLMSGHDR.pack(length, kind, 0, 0, 0) + payload
+            + b"\0" * (ip_watch._align(length) - length))
+
+
+def test_newaddr_and_overrun_in_one_datagram():
+    ifaddr = ip_watch.IFADDRMSG.pack(socket.AF_INET, 24, 0, 0, 3)
+    ifaddr += rtattr(ip_watch.IFA_ADDRESS, socket.inet_aton("192.168.42.1"))
+    ifaddr += rtattr(ip_watch.IFA_LOCAL, socket.inet_aton("192.168.42.10"))
+    ifaddr += rtattr(ip_watch.IFA_LABEL, b"usb0\0")
+    data = nlmsg(ip_watch.RTM_NEWADDR, ifaddr) + nlmsg(ip_watch.NLMSG_OVERRUN)
+    assert ip_watch.parse_messages(data) == [
+        # IFA_LOCAL menang atas IFA_ADDRESS (alamat peer pada point-to-point)
+        ip_watch.AddressEvent("add", 3, socket.AF_INET, "192.168.42.10", 24, "usb0"),
+        ip_watch.AddressEvent("resync", 0, 0, None, 0, None),
+    ]
+
+
+def test_deladdr_ipv6_and_dellink():
+    ifaddr = ip_watch.IFADDRMSG.pack(socket.AF_INET6, 64, 0, 0, 2)
+    ifaddr += rtattr(ip_watch.IFA_ADDRESS, socket.inet_pton(socket.AF_INET6, "fd00::5"))
+    ifinfo = ip_watch.IFINFOMSG.pack(socket.AF_UNSPEC, 1, 4, ip_watch.IFF_UP, 0)
+    ifinfo += rtattr(ip_watch.IFLA_IFNAME, b"usb1\0")
+    data = nlmsg(ip_watch.RTM_DELADDR, ifaddr) + nlmsg(ip_watch.RTM_DELLINK, ifinfo)
+    assert ip_watch.parse_messages(data) == [
+        ip_watch.AddressEvent("remove", 2, socket.AF_INET6, "fd00::5", 64, None),
+        ip_watch.LinkEvent("remove", 4, "usb1", True),
+    ]
+
+
+def test_done_and_truncated_messages_stop_parsing():
+    ifinfo = ip_watch.IFINFOMSG.pack(socket.AF_UNSPEC, 1, 4, 0, 0)
+    new_link = nlmsg(ip_watch.RTM_NEWLINK, ifinfo)
+    assert ip_watch.parse_messages(new_link + nlmsg(ip_watch.NLMSG_DONE) + new_link) == [
+        ip_watch.LinkEvent("add", 4, None, False)]
+    # Header dengan panjang mustahil tidak membuat parser berputar di tempat
+    assert ip_watch.parse_messages(ip_watch.NLMSGHDR.pack(4, ip_watch.RTM_NEWLINK, 0, 0, 0)) == []
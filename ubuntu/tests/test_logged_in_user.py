@@ -0,0 +1,27 @@
+# Built-in modules
+import subprocess
+
+# Local modules
+import usb_monitor
+
+
+def test_missing_utmp_forks_who_once(tmp_path, monkeypatch, capsys):
+    calls = []
+    monkeypatch.setattr(usb_monitor._session_cache, "path", str(tmp_path / "utmp"))
+    monkeypatch.setattr(usb_monitor, "_utmp_failed", False)
+    monkeypatch.setattr(usb_monitor, "_who_cache", None)
+    monkeypatch.setattr(subprocess, "check_output", lambda cmd: calls.append(cmd) or b"alice pts/0\n")
+
+    assert [usb_monitor.get_logged_in_user() for _ in range(5)] == ["alice"] * 5
+    assert calls == [["who"]]
+    assert capsys.readouterr().out.count("Failed to read utmp") == 1
+
+
+def test_load_config_does_not_resolve_temp_dir(tmp_path, monkeypatch):
+    env = tmp_path / ".env"
+    env.write_text("")
+    monkeypatch.setenv("USBNOTIFY_ENV", str(env))
+    monkeypatch.setattr(usb_monitor, "TEMP_DIR", None)
+    monkeypatch.setattr(usb_monitor, "get_logged_in_user", lambda: (_ for _ in ()).throw(AssertionError("utmp read")))
+    usb_monitor.load_config()
+    assert usb_monitor.TEMP_DIR is None
@@ -0,0 +1,38 @@
+# Local modules
+import ratelimit
+
+
+def limiter():
+    return ratelimit.AlertLimiter(60, 10, 60, 10, debounce=30)
+
+
+def test_reattach_on_same_host_is_debounced():
+    alerts = limiter()
+    assert alerts.debounce("host-a", "SERIAL1", now=100)
+    assert not alerts.debounce("host-a", "SERIAL1", now=110)
+    assert alerts.take_suppressed("host-a") == 1
+    assert alerts.debounce("host-a", "SERIAL1", now=150)
+
+
+def test_device_moving_to_another_host_is_alerted():
+    alerts = limiter()
+    assert alerts.debounce("host-a", "SERIAL1", now=100)
+    assert alerts.debounce("host-b", "SERIAL1", now=101)
+
+
+def test_global_clamp_does_not_spend_host_tokens():
+    # Rate sangat kecil: tidak ada isi ulang selama test
+    alerts = ratelimit.AlertLimiter(0.001, 1, 0.001, 2, debounce=30)
+    assert alerts.acquire("host-a")
+    # Global habis: alert ditolak tanpa memakan token host
+    assert not alerts.acquire("host-a")
+    assert not alerts.acquire("host-a")
+    assert alerts.host_buckets["host-a"].tokens >= 1
+    assert alerts.take_suppressed("host-a") == 2
+
+
+def test_host_clamp_does_not_spend_global_tokens():
+    alerts = ratelimit.AlertLimiter(0.001, 2, 0.001, 1, debounce=30)
+    assert alerts.acquire("host-a")
+    assert not alerts.acquire("host-a")
+    assert alerts.acquire("host-b")
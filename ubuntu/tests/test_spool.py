@@ -0,0 +1,102 @@
+# Built-in modules
+import os
+import time
+
+# Local modules
+import spool
+
+
+def drain(failed):
+    return [body for bodies, _ in failed.iter_batches() for body in bodies]
+
+
+def test_replay_resumes_from_checkpoint(tmp_path):
+    failed = spool.Spool(str(tmp_path))
+    for i in range(5):
+        failed.append(f"email {i}")
+    batches = list(failed.iter_batches(max_bytes=len("email 0") * 2))
+    assert [bodies for bodies, _ in batches] == [["email 0", "email 1"], ["email 2", "email 3"], ["email 4"]]
+
+    failed.ack(batches[0][1])
+    assert drain(failed) == ["email 2", "email 3", "email 4"]
+    # Proses baru melanjutkan dari checkpoint yang sama
+    failed.close()
+    assert drain(spool.Spool(str(tmp_path))) == ["email 2", "email 3", "email 4"]
+
+
+def test_compact_drops_acked_records(tmp_path):
+    failed = spool.Spool(str(tmp_path))
+    for i in range(3):
+        failed.append(f"email {i}")
+    batches = list(failed.iter_batches(max_bytes=1))
+    failed.ack(batches[1][1])
+    failed.compact()
+    assert failed.checkpoint() == 0
+    assert drain(failed) == ["email 2"]
+    failed.append("email 3")
+    assert drain(failed) == ["email 2", "email 3"]
+    assert failed.pending_bytes() == failed.size()
+
+
+def test_corrupt_and_truncated_records_are_skipped(tmp_path):
+    failed = spool.Spool(str(tmp_path))
+    failed.append("good 1")
+    failed.append("bad")
+    failed.append("good 2")
+    failed.close()
+    with open(failed.path, "r+b") as f:
+        data = bytearray(f.read())
+        # Rusak satu byte payload record kedua, lalu potong record terakhir setengah
+        second = spool.RECORD_HEADER.size + len("good 1") + spool.RECORD_HEADER.size
+        data[second] ^= 0xFF
+        f.seek(0)
+        f.write(data + spool.RECORD_HEADER.pack(100, 0) + b"partial")
+    assert drain(spool.Spool(str(tmp_path))) == ["good 1", "good 2"]
+
+
+def test_short_burst_is_fsynced_by_deadline(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(spool.os, "fsync", lambda fd: (synced.append(fd), real_fsync(fd)))
+
+    failed = spool.Spool(str(tmp_path), fsync_every=16, fsync_interval=0.1)
+    failed.last_sync = time.monotonic()
+    failed.append("email 0")
+    failed.append("email 1")
+    assert synced == [] and failed.unsynced == 2
+    deadline = time.monotonic() + 2
+    while failed.unsynced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert failed.unsynced == 0
+    assert len(synced) == 1
+    failed.close()
+
+
+def test_crash_mid_append_then_more_appends(tmp_path):
+    failed = spool.Spool(str(tmp_path))
+    failed.append("good 1")
+    failed.close()
+    with open(failed.path, "ab") as f:
+        f.write(spool.RECORD_HEADER.pack(100, 0) + b"partial")
+
+    # Proses baru setelah crash: ekor terpotong dibuang sebelum append berikutnya
+    restarted = spool.Spool(str(tmp_path))
+    for i in range(2, 5):
+        restarted.append(f"good {i}")
+    assert drain(restarted) == ["good 1", "good 2", "good 3", "good 4"]
+    batches = list(restarted.iter_batches())
+    restarted.ack(batches[-1][1])
+    assert restarted.pending_bytes() == 0
+    restarted.close()
+
+
+def test_oversized_length_is_not_trusted(tmp_path):
+    failed = spool.Spool(str(tmp_path))
+    failed.append("good 1")
+    failed.close()
+    with open(failed.path, "ab") as f:
+        # Bit terbalik di header: panjang ~4 GiB tidak boleh dialokasikan
+        f.write(spool.RECORD_HEADER.pack(0xFFFFFFF0, 0) + b"x" * 64)
+    assert drain(spool.Spool(str(tmp_path))) == ["good 1"]
+    # Ekor rusak sudah dipotong: yang tersisa hanya record yang sah
+    assert failed.pending_bytes() == spool.RECORD_HEADER.size + len("good 1")
@@ -0,0 +1,73 @@
+# Built-in modules
+import os
+
+# Third-party modules
+import pytest
+
+# Local modules
+import usb_monitor
+
+
+def test_private_state_dir_is_accepted(tmp_path):
+    os.chmod(tmp_path, 0o700)
+    db = tmp_path / "devices.db"
+    assert usb_monitor.is_private_path(str(db))
+    db.write_text("")
+    os.chmod(db, 0o600)
+    assert usb_monitor.is_private_path(str(db))
+
+
+def test_world_writable_dir_or_file_is_refused(tmp_path):
+    os.chmod(tmp_path, 0o777)
+    assert not usb_monitor.is_private_path(str(tmp_path / "devices.db"))
+    os.chmod(tmp_path, 0o700)
+    db = tmp_path / "devices.db"
+    db.write_text("")
+    os.chmod(db, 0o666)
+    assert not usb_monitor.is_private_path(str(db))
+
+
+def test_file_owned_by_another_user_is_refused(tmp_path):
+    if os.geteuid() != 0:
+        pytest.skip("chown ke user lain butuh root")
+    os.chmod(tmp_path, 0o700)
+    db = tmp_path / "devices.db"
+    db.write_text("")
+    os.chown(db, 65534, 65534)
+    assert not usb_monitor.is_private_path(str(db))
+
+
+class FakeDevice(dict):
+    subsystem = "usb"
+    device_type = "usb_device"
+    action = "add"
+    sys_name = "1-1"
+
+
+@pytest.fixture
+def unwritable_state_dir(tmp_path, monkeypatch):
+    # Direktori di bawah file biasa tidak pernah bisa dibuat, root sekalipun
+    (tmp_path / "file").write_text("")
+    monkeypatch.setattr(usb_monitor, "STATE_DIR", tmp_path / "file" / "state")
+    monkeypatch.setattr(usb_monitor, "_inventory", None)
+    monkeypatch.setattr(usb_monitor, "_inventory_refused", False)
+    monkeypatch.setattr(usb_monitor, "_usb_snapshot", None)
+
+
+def test_unwritable_state_dir_alerts_everything(unwritable_state_dir):
+    assert usb_monitor.get_inventory() is None
+    assert usb_monitor.should_alert_device(FakeDevice())
+    snapshot = usb_monitor.get_usb_snapshot()
+    assert snapshot.path is None and snapshot.loaded
+
+
+def test_snapshot_failure_does_not_skip_alert(unwritable_state_dir, monkeypatch):
+    reported = []
+    monkeypatch.setattr(usb_monitor, "event_allowed", lambda device: True)
+    monkeypatch.setattr(usb_monitor, "report_usb_device", lambda device, action: reported.append(action))
+
+    def broken_snapshot():
+        raise OSError("read-only file system")
+    monkeypatch.setattr(usb_monitor, "get_usb_snapshot", broken_snapshot)
+    usb_monitor.handle_usb_device(FakeDevice(ID_SERIAL_SHORT="ABC123"))
+    assert reported == ["add"]
@@ -0,0 +1,55 @@
+# Built-in modules
+import threading
+
+# Local modules
+import usb_ids
+
+USB_IDS = """\
+# Contoh potongan usb.ids
+1d6b  Linux Foundation
+\t0002  2.0 root hub
+\t0003  3.0 root hub
+046d  Logitech, Inc.
+\tc52b  Unifying Receiver
+\t\t00  Interface (diabaikan)
+C 00  (Defined at Interface level)
+\t01  Audio
+"""
+
+
+def write_source(tmp_path):
+    source = tmp_path / "usb.ids"
+    source.write_text(USB_IDS)
+    return str(source)
+
+
+def test_lookup_vendor_and_product(tmp_path):
+    ids = usb_ids.UsbIds(str(tmp_path / "usb.ids.idx"), source=write_source(tmp_path))
+    assert ids.vendor("1d6b") == "Linux Foundation"
+    assert ids.product("046d", "c52b") == "Unifying Receiver"
+    assert ids.product(0x1d6b, 0x0003) == "3.0 root hub"
+    assert ids.vendor("ffff") is None
+    assert ids.product("1d6b", "zzzz") is None
+    ids.close()
+
+
+def test_concurrent_open_builds_index_once(tmp_path):
+    source = write_source(tmp_path)
+    for trial in range(10):
+        ids = usb_ids.UsbIds(str(tmp_path / f"trial{trial}.idx"), source=source)
+        errors = []
+
+        def lookup():
+            try:
+                assert ids.vendor("046d") == "Logitech, Inc."
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=lookup) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        ids.close()
+    assert not list(tmp_path.glob("*.tmp"))
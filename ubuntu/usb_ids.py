@@ -0,0 +1,237 @@
+"""Resolusi nama vendor/produk USB dari database ``usb.ids``.
+
+File teks usb.ids (~700 KB) tidak di-parse saat agent start. Isinya dikompilasi
+sekali menjadi index biner terurut yang di-mmap; lookup memakai binary search
+langsung di atas mmap, dengan LRU kecil untuk ID yang sering muncul. Index
+dibangun ulang otomatis jika ukuran/mtime usb.ids berubah.
+
+Format index (big-endian)::
+
+    header   = magic:8s | source_mtime_ns:u64 | source_size:u64 | vendors:u32 | products:u32
+    vendor   = id:u16 | name_offset:u32 | name_len:u16          (urut id)
+    product  = vendor_id:u16 | product_id:u16 | name_offset:u32 | name_len:u16   (urut id)
+    names    = string UTF-8 tanpa pemisah
+
+Contoh:
+    python usb_ids.py build --output /var/lib/usbnotify/usb.ids.idx
+    python usb_ids.py lookup 1d6b 0002 --index /var/lib/usbnotify/usb.ids.idx
+"""
+
+# Built-in modules
+import functools
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+DEFAULT_SOURCES = ("/usr/share/hwdata/usb.ids", "/usr/share/misc/usb.ids", "/var/lib/usbutils/usb.ids")
+
+MAGIC = b"USBIDX1\0"
+HEADER = struct.Struct(">8sQQII")
+VENDOR = struct.Struct(">HIH")
+PRODUCT = struct.Struct(">HHIH")
+
+
+def find_source(path=None):
+    if path:
+        return path
+    for candidate in DEFAULT_SOURCES:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _hex_id(value):
+    return int(value, 16) if isinstance(value, str) else value
+
+
+def parse_usb_ids(path):
+    """Return ``(vendors, products)``: {vid: nama} dan {(vid, pid): nama}."""
+    vendors, products = {}, {}
+    vendor = None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            if line.startswith("\t\t"):
+                continue  # interface
+            if line.startswith("\t"):
+                if vendor is not None:
+                    ident, _, name = line.strip().partition("  ")
+                    try:
+                        products[(vendor, int(ident, 16))] = name.strip()
+                    except ValueError:
+                        pass
+                continue
+            ident, _, name = line.rstrip("\n").partition("  ")
+            # Bagian setelah daftar vendor (C, AT, HID, ...) tidak diawali 4 digit hex
+            if len(ident) == 4:
+                try:
+                    vendor = int(ident, 16)
+                    vendors[vendor] = name.strip()
+                    continue
+                except ValueError:
+                    pass
+            vendor = None
+    return vendors, products
+
+
+def build_index(source, output):
+    vendors, products = parse_usb_ids(source)
+    stat = os.stat(source)
+
+    names = bytearray()
+    vendor_rows, product_rows = [], []
+    for vid in sorted(vendors):
+        data = vendors[vid].encode("utf-8")[:0xFFFF]
+        vendor_rows.append(VENDOR.pack(vid, len(names), len(data)))
+        names += data
+    for vid, pid in sorted(products):
+        data = products[(vid, pid)].encode("utf-8")[:0xFFFF]
+        product_rows.append(PRODUCT.pack(vid, pid, len(names), len(data)))
+        names += data
+
+    directory = os.path.dirname(output) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Tulis ke file sementara (nama unik per pemanggil) lalu rename supaya pembaca
+    # tidak melihat index setengah jadi
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(output) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size, len(vendor_rows), len(product_rows)))
+            f.write(b"".join(vendor_rows))
+            f.write(b"".join(product_rows))
+            f.write(names)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, output)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(vendor_rows), len(product_rows)
+
+
+class UsbIds:
+    """Lookup nama vendor/produk dari index ``index_path`` (dibangun dari ``source`` jika perlu)."""
+
+    def __init__(self, index_path, source=None, cache_size=256):
+        self.index_path = index_path
+        self.source = find_source(source)
+        self.map = None
+        # warm-up di executor dan lookup dari event loop bisa memanggil open() bersamaan
+        self.lock = threading.Lock()
+        self.vendors = self.products = 0
+        self.vendor = functools.lru_cache(maxsize=cache_size)(self._vendor)
+        self.product = functools.lru_cache(maxsize=cache_size)(self._product)
+
+    def open(self):
+        if self.map is not None:
+            return True
+        with self.lock:
+            if self.map is not None:
+                return True
+            if not self._index_current():
+                if self.source is None:
+                    return False
+                build_index(self.source, self.index_path)
+            with open(self.index_path, "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            _, _, _, self.vendors, self.products = HEADER.unpack_from(index)
+            self.vendor_base = HEADER.size
+            self.product_base = self.vendor_base + self.vendors * VENDOR.size
+            self.names_base = self.product_base + self.products * PRODUCT.size
+            # Diisi terakhir: thread lain yang melihat map sudah melihat offset yang benar
+            self.map = index
+            return True
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+        self.vendor.cache_clear()
+        self.product.cache_clear()
+
+    def _index_current(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, mtime_ns, size, _, _ = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return False
+        if magic != MAGIC:
+            return False
+        if self.source is None:
+            return True
+        try:
+            stat = os.stat(self.source)
+        except OSError:
+            return True
+        return (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size)
+
+    def _name(self, offset, length):
+        start = self.names_base + offset
+        return self.map[start:start + length].decode("utf-8", errors="replace")
+
+    def _search(self, base, count, row, key):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            fields = row.unpack_from(self.map, base + mid * row.size)
+            current = fields[:-2]
+            if current == key:
+                return self._name(fields[-2], fields[-1])
+            if current < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _vendor(self, vendor_id):
+        if not vendor_id or not self.open():
+            return None
+        try:
+            key = (_hex_id(vendor_id),)
+        except ValueError:
+            return None
+        return self._search(self.vendor_base, self.vendors, VENDOR, key)
+
+    def _product(self, vendor_id, product_id):
+        if not vendor_id or not product_id or not self.open():
+            return None
+        try:
+            key = (_hex_id(vendor_id), _hex_id(product_id))
+        except ValueError:
+            return None
+        return self._search(self.product_base, self.products, PRODUCT, key)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the usb.ids index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="compile usb.ids into a binary index")
+    build.add_argument("--source", default=None, help="path to usb.ids")
+    build.add_argument("--output", required=True)
+    lookup = sub.add_parser("lookup", help="resolve a vendor (and product) ID")
+    lookup.add_argument("vendor_id")
+    lookup.add_argument("product_id", nargs="?")
+    lookup.add_argument("--index", required=True)
+    lookup.add_argument("--source", default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        source = find_source(args.source)
+        if source is None:
+            parser.error("usb.ids not found, pass --source")
+        vendors, products = build_index(source, args.output)
+        print(f"Indexed {vendors} vendors and {products} products from {source}")
+    else:
+        ids = UsbIds(args.index, args.source)
+        print(ids.vendor(args.vendor_id) or "Unknown vendor")
+        if args.product_id:
+            print(ids.product(args.vendor_id, args.product_id) or "Unknown product")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,136 @@
 # Built-in modules
 import datetime
+import errno
 import os
 import platform
+import pwd
+import signal
 import socket
-import subprocess
-import threading
 import time
-import uuid
-import pwd
 import pyudev
 
-# Third-party modules
-import psutil
-import schedule
-import smtplib
-from dotenv import load_dotenv
-
-# Email modules (built-in, tapi spesifik)
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-
 # Standard library pathlib
 from pathlib import Path
 
-# Memuat isi dari file .env
-load_dotenv()
+# Local modules
+# Modul berat (asyncio, dotenv, psutil, smtplib/email, sqlite3) di-import saat
+# pertama kali dipakai, supaya monitor udev bisa aktif secepat mungkin
+import alert_batch
+import alert_templates
+import config
+import ip_watch
+import metrics
+import ratelimit
+import sinks
+import spool
+import usb_snapshot
+import utmp
 
 current_os = platform.system()
     
+UDEV_EVENTS_RECEIVED = metrics.REGISTRY.counter("usbnotify_udev_events_received_total", "udev events delivered to the agent")
+UDEV_EVENTS_FILTERED = metrics.REGISTRY.counter("usbnotify_udev_events_filtered_total", "udev events discarded by the allow-list")
+EMAILS_SPOOLED = metrics.REGISTRY.counter("usbnotify_emails_spooled_total", "Failed emails written to the spool")
+DEVICES_SUPPRESSED = metrics.REGISTRY.counter("usbnotify_devices_suppressed_total", "USB devices not alerted because of inventory policy")
+UDEV_OVERFLOWS = metrics.REGISTRY.counter("usbnotify_udev_overflows_total", "udev receive buffer overflows (episodes with lost events)")
+ALERTS_RATE_LIMITED = metrics.REGISTRY.counter("usbnotify_alerts_rate_limited_total", "Alert emails dropped by the rate limiter")
+GET_INFO_SECONDS = metrics.REGISTRY.histogram("usbnotify_get_info_seconds", "get_info latency")
+GET_USER_SECONDS = metrics.REGISTRY.histogram("usbnotify_get_logged_in_user_seconds", "get_logged_in_user latency")
+
+_session_cache = utmp.SessionCache()
+
+def get_logged_in_sessions():
+    # Dibaca langsung dari /var/run/utmp, di-cache sampai file berubah
+    return _session_cache.get()
+
 def get_logged_in_user():
+    with GET_USER_SECONDS.time():
+        return _get_logged_in_user()
+
+# Tanpa utmp (container, host minimal) hasil `who` di-cache: fork sekali per WHO_CACHE_TTL,
+# bukan per event, dan peringatannya hanya dicetak sekali
+WHO_CACHE_TTL = 60.0
+_utmp_failed = False
+_who_cache = None  # (kedaluwarsa monotonic, user)
+
+def _get_logged_in_user():
+    global _utmp_failed, _who_cache
     try:
-        output = subprocess.check_output(['who']).decode().strip()
-        if output:
-            return output.split()[0]
+        sessions = get_logged_in_sessions()
+        _utmp_failed = False
+        if sessions:
+            return sessions[0].user
         else:
             return "Unknown"
-        
+
+    except Exception as e:
+        if not _utmp_failed:
+            print(f"Failed to read utmp, falling back to who: {e}")
+            _utmp_failed = True
+
+    now = time.monotonic()
+    if _who_cache is not None and now < _who_cache[0]:
+        return _who_cache[1]
+    user = "Unknown"
+    try:
+        import subprocess
+        output = subprocess.check_output(['who']).decode().strip()
+        if output:
+            user = output.split()[0]
+
     except Exception as e:
         print(f"Failed to get logged-in user: {e}")
-        return "Unknown"
+    _who_cache = (now + WHO_CACHE_TTL, user)
+    return user
 
-def get_info():
-    hostname = socket.gethostname()
-    ip = 'Not found'
-
-    # Cari IP pertama yang bukan localhost (127.x.x.x) atau APIPA (169.x.x.x)
-    for interface_name, interface_addresses in psutil.net_if_addrs().items():
-        for address in interface_addresses:
-            if (
-                address.family == socket.AF_INET and
-                not address.address.startswith('127.') and
-                not address.address.startswith('169.')
-            ):
-                ip = address.address
-                break  # Ambil IP pertama yang valid
-        if ip != 'Not found':
-            break
+_host_identity = None
 
-    # Ambil MAC address
-    try:
-        mac = ':'.join(['{:02x}'.format((uuid.getnode() >> i) & 0xff)
-                        for i in range(0, 8*6, 8)][::-1])
-    except:
-        mac = 'Not found'
+def get_host_identity():
+    global _host_identity
+    if _host_identity is None:
+        import host_identity
+        cfg = config.current()
+        _host_identity = host_identity.HostIdentity(policy=cfg.ip_policy, ttl=cfg.host_info_ttl)
+    return _host_identity
 
-    ip_is_illegal = ip and not ip.startswith(os.getenv("VALID_IP_PREFIX", ""))
-    return hostname, ip, mac, ip_is_illegal
+def get_info():
+    # Snapshot dari cache; dihitung ulang hanya saat alamat berubah atau TTL habis
+    with GET_INFO_SECONDS.time():
+        return tuple(get_host_identity().snapshot())
 
 # Deteksi dan Tindakan Jika IP Tidak Sah
-def check_illegal_ip(prev_ip=None):
-    user = get_logged_in_user()
-    waktu = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def check_illegal_ip(prev_ip=None, table=None, changed=()):
+    """Evaluasi kebijakan IP untuk interface di ``changed`` (ifindex) saja.
+
+    Alert dikirim per interface, hanya untuk alamat tidak sah yang baru muncul
+    di interface itu; ``ip_change`` dikirim saat IP utama host berubah.
+    """
     hostname, ip, mac, ip_is_illegal = get_info()
+    alerts = table.evaluate(changed, config.current().ip_policy) if table is not None else []
+    if alerts:
+        user = get_logged_in_user()
+        waktu = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for entry, new, violations in alerts:
+        print(f"\n[ALERT] IP Tidak Sah Terdeteksi!")
+        print(f"Hostname : {hostname}")
+        print(f"IP       : {new[0][1]}")
+        print(f"Interface: {entry.name}")
+        print(f"MAC      : {mac}")
+        print(f"OS       : {current_os}")
+        emit_event({
+            "type": "illegal_ip",
+            "time": datetime.datetime.now().isoformat(),
+            "waktu": waktu,
+            "user": user,
+            "hostname": hostname,
+            "ip": str(new[0][1]),
+            "interface": entry.name,
+            "link": "up" if entry.up else "down",
+            "violations": ", ".join(f"{address} ({interface})" for interface, address in violations),
+            "mac": mac,
+            "os": current_os,
+        })
+
     # Abaikan jika IP belum ditemukan
     if ip == "Not found":
         return prev_ip
@@ -80,69 +139,150 @@ def check_illegal_ip(prev_ip=None):
     if prev_ip == ip:
         return ip
 
-    if ip_is_illegal:
-        print(f"\n[ALERT] IP Tidak Sah Terdeteksi!")
-        print(f"Hostname : {hostname}")
-        print(f"IP       : {ip}")
-        print(f"MAC      : {mac}")
-        print(f"OS       : {current_os}")
-        html = f"""
-        <html>
-        <body>
-            <p><strong>[ALERT]</strong> Unauthorized IP detected at <strong>{waktu}</strong> by user: <strong>{user}</strong></p>
-            <table border="1" cellpadding="6" cellspacing="0" style="border-collapse: collapse; font-family: Arial, sans-serif; font-size: 14px;">
-            <tr style="background-color: #f2f2f2;">
-                <th align="left">Field</th>
-                <th align="left">Value</th>
-            </tr>
-            <tr><td>Hostname</td><td>{hostname}</td></tr>
-            <tr><td>IP Address</td><td>{ip}</td></tr>
-            <tr><td>MAC Address</td><td>{mac}</td></tr>
-            <tr><td>OS</td><td>{current_os}</td></tr>
-            </table>
-        </body>
-        </html>
-        """
-        # Kirim email alert
-        send_email("🚨 Alert: Unauthorized IP Detected", html, save_if_failed=False)
-    else:
+    if not ip_is_illegal:
         print(f"[OK] IP valid: {ip}")
+        emit_event({
+            "type": "ip_change",
+            "time": datetime.datetime.now().isoformat(),
+            "hostname": hostname,
+            "ip": ip,
+            "previous_ip": prev_ip,
+        })
 
     return ip
 
-def ip_monitor_loop():
-    print("[INFO] Memulai pemantauan IP (loop polling)...")
-    previous_ip = None
-    while True:
-        previous_ip = check_illegal_ip(previous_ip)
-        time.sleep(5)  # Cek setiap 5 detik
+class IPMonitor:
+    """State pemantauan IP yang dijalankan di event loop asyncio.
 
-def send_email(subject, body, save_if_failed=True):
-    from_email = os.getenv("EMAIL_HOST_USER")
-    password = os.getenv("EMAIL_HOST_PASSWORD")
-    to_email = os.getenv("TO_EMAIL")
+    Tabel interface (per ifindex) diperbarui dari notifikasi netlink dan event
+    udev ``net``; kebijakan IP hanya dievaluasi ulang untuk entri yang berubah.
+    """
 
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = subject
-    msg["From"] = from_email
-    msg["To"] = to_email
-    msg.attach(MIMEText(body, "html"))
+    def __init__(self):
+        self.previous_ip = None
+        self.table = None
+        self.watcher = None
+        self.poll_task = None
 
-    try:
-        server = smtplib.SMTP(os.getenv("EMAIL_HOST"), (os.getenv("EMAIL_PORT")))
-        server.ehlo()
-        server.starttls()
-        server.ehlo()
-        server.login(from_email, password)
-        server.sendmail(from_email, [to_email], msg.as_string())
-        server.quit()
-        print("Email sent successfully.")
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        if save_if_failed:
-            save_failed_email(body)
-        return False
+    def check(self, changed=()):
+        self.previous_ip = check_illegal_ip(self.previous_ip, self.table, changed)
+
+    def update(self, changed):
+        if changed:
+            get_host_identity().refresh()
+            self.check(changed)
+
+    def on_address_events(self):
+        changed = set()
+        for event in self.watcher.read_events():
+            if event.action == "resync":
+                changed |= self.table.load()
+            elif isinstance(event, ip_watch.LinkEvent):
+                if self.table.apply_link(event):
+                    changed.add(event.ifindex)
+            elif self.table.apply_address(event):
+                changed.add(event.ifindex)
+        self.update(changed)
+
+    def on_net_device(self, device):
+        # Dipanggil dari handle_usb_device untuk event udev subsystem net
+        ifindex = self.table.apply_udev(device.action, device.sys_name, device.get("IFINDEX"))
+        if ifindex is not None:
+            self.update({ifindex})
+
+    def resync(self):
+        self.update(self.table.load())
+
+    async def poll_loop(self):
+        import asyncio
+        print("[INFO] Memulai pemantauan IP (loop polling)...")
+        while True:
+            self.resync()
+            await asyncio.sleep(5)  # Cek setiap 5 detik
+
+    def recheck(self):
+        # Kebijakan IP berubah: status alamat yang sama pun bisa berubah
+        self.previous_ip = None
+        self.table.forget_reported()
+        get_host_identity().refresh()
+        self.check(set(self.table.entries))
+
+    def start(self, loop):
+        import interfaces
+
+        self.table = interfaces.InterfaceTable()
+        # Identitas host memakai alamat dari tabel, bukan scan psutil terpisah
+        get_host_identity().source = self.table.addresses
+
+        watcher = ip_watch.AddressWatcher()
+        try:
+            watcher.open()
+        except OSError as e:
+            # Netlink tidak tersedia (container, seccomp, dll) -> kembali ke polling
+            print(f"[WARN] Netlink socket unavailable ({e}), falling back to polling.")
+            self.poll_task = loop.create_task(self.poll_loop())
+            return
+
+        print("[INFO] Memulai pemantauan IP (netlink)...")
+        self.watcher = watcher
+        # Tidak ada kerja sama sekali selama alamat tidak berubah
+        loop.add_reader(watcher.fileno(), self.on_address_events)
+        self.resync()
+
+    def stop(self, loop):
+        if self.watcher is not None:
+            loop.remove_reader(self.watcher.fileno())
+            self.watcher.close()
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+
+_ip_monitor = None
+
+def get_ip_monitor():
+    global _ip_monitor
+    if _ip_monitor is None:
+        _ip_monitor = IPMonitor()
+    return _ip_monitor
+
+_mail_sender = None
+
+def get_delivery():
+    import delivery
+
+    cfg = config.current()
+    # Relay utama lalu cadangan (EMAIL_FALLBACK_HOSTS=host:port,host:port), dicoba berurutan
+    relays = [
+        delivery.SMTPRelay(host, port, cfg.email_user, cfg.email_password,
+                           cfg.smtp_starttls, cfg.smtp_timeout)
+        for host, port in ((cfg.email_host, cfg.email_port),) + cfg.email_fallback_hosts
+    ]
+    transports = [delivery.SMTPTransport(relays, cfg.email_user, list(cfg.recipients),
+                                         timeout=cfg.smtp_timeout)]
+    if cfg.syslog_socket:
+        transports.append(delivery.SyslogTransport(cfg.syslog_socket))
+    if cfg.webhook_url:
+        transports.append(delivery.WebhookTransport(cfg.webhook_url, timeout=cfg.webhook_timeout))
+
+    return delivery.Delivery(transports, max_workers=cfg.delivery_workers)
+
+def get_mail_sender():
+    global _mail_sender
+    if _mail_sender is None:
+        import mailer
+        _mail_sender = mailer.MailSender(
+            get_delivery(),
+            maxsize=config.current().mail_queue_size,
+            keepalive=config.current().smtp_keepalive,
+            on_failure=save_failed_email,
+        ).start()
+    return _mail_sender
+
+def send_email(subject, body, save_if_failed=True, wait=False, text=None, required_only=False):
+    # Non-blocking: email masuk antrean dan dikirim oleh worker SMTP
+    future = get_mail_sender().enqueue(subject, body, save_if_failed, text=text, required_only=required_only)
+    if wait:
+        return future.result()
+    return True
 
 def get_home_dir(username):
     try:
@@ -161,128 +301,748 @@ def get_temp_dir():
     # fallback pakai Path.home() (home user proses saat ini)
     return Path.home() / ".cache" / "temp_dir"
 
-# Usage example
-TEMP_DIR = get_temp_dir()
+# Diisi oleh temp_dir() saat pertama dipakai, tidak saat import/start
+TEMP_DIR = None
+
+def temp_dir():
+    global TEMP_DIR
+    if TEMP_DIR is None:
+        TEMP_DIR = get_temp_dir()
+    return TEMP_DIR
+
+# Inventaris dan snapshot USB menentukan perangkat mana yang di-alert, jadi disimpan
+# di direktori milik root, bukan di home user yang dipantau (lihat STATE_DIR)
+STATE_DIR = None
+
+def state_dir():
+    global STATE_DIR
+    if STATE_DIR is None:
+        STATE_DIR = Path(config.current().state_dir)
+    os.makedirs(STATE_DIR, mode=0o700, exist_ok=True)
+    return STATE_DIR
+
+def is_private_path(path):
+    """True jika file (bila sudah ada) dan direktorinya hanya bisa ditulis oleh root/proses ini."""
+    owners = {0, os.geteuid()}
+    for candidate in (path, os.path.dirname(os.path.abspath(path))):
+        try:
+            st = os.stat(candidate)
+        except FileNotFoundError:
+            continue
+        if st.st_uid not in owners or st.st_mode & 0o022:
+            return False
+    return True
+
+_failed_spool = None
+
+def get_failed_spool():
+    global _failed_spool
+    if _failed_spool is None:
+        _failed_spool = spool.Spool(str(temp_dir()))
+        metrics.REGISTRY.gauge("usbnotify_spool_pending_bytes", "Unsent bytes in the failed-email spool",
+                               callback=_failed_spool.pending_bytes)
+    return _failed_spool
 
 def save_failed_email(body):
-    os.makedirs(TEMP_DIR, exist_ok=True)
-    # Timestamp tanpa karakter ilegal (ganti ':' dengan '-')
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = TEMP_DIR / f"email_{timestamp}.txt"
-    
     try:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(body)
-        print(f"Failed email content saved to: {filename}")
+        get_failed_spool().append(body)
+        EMAILS_SPOOLED.inc()
+        print(f"Failed email content spooled to: {get_failed_spool().path}")
+        if _resend_scheduler is not None:
+            _resend_scheduler.notify()
     except Exception as e:
         print(f"Error saving failed email: {e}")
 
-# Gabung body jadi satu email
+def import_legacy_failed_emails():
+    # File email_*.txt dari versi lama dipindah ke spool
+    if not os.path.exists(temp_dir()):
+        return
+    for file_path in sorted(Path(temp_dir()).glob("email_*.txt")):
+        try:
+            get_failed_spool().append(file_path.read_text(encoding="utf-8"))
+            os.remove(file_path)
+        except Exception as e:
+            print(f"Error importing {file_path}: {e}")
+    get_failed_spool().sync()
+
+# Gabung body per batch (ukuran terbatas) lalu kirim
 def resend_failed_emails():
-    if not os.path.exists(TEMP_DIR):
+    """Kirim ulang isi spool dalam batch berukuran terbatas; True jika spool habis."""
+    import_legacy_failed_emails()
+    failed_spool = get_failed_spool()
+    if not failed_spool.pending_bytes():
+        print("No failed emails to resend.")
+        return True
+
+    max_bytes = config.current().resend_batch_bytes
+    for bodies, end_offset in failed_spool.iter_batches(max_bytes):
+        combined_body = "<br><br>".join(bodies)
+        # Hanya lewat SMTP: syslog/webhook sudah menerima alert ini saat pertama dikirim
+        success = send_email("🔔 Alert: USB Device Connection Detected", combined_body,
+                             save_if_failed=False, wait=True, required_only=True)
+        if not success:
+            print("Resend failed. Spool kept for next run.")
+            break
+        failed_spool.ack(end_offset)
+        print(f"Resent {len(bodies)} spooled emails.")
+
+    failed_spool.compact()
+    return not failed_spool.pending_bytes()
+
+_alert_limiter = None
+
+def get_alert_limiter():
+    global _alert_limiter
+    if _alert_limiter is None:
+        _alert_limiter = ratelimit.AlertLimiter(**alert_limiter_settings(config.current()))
+    return _alert_limiter
+
+def alert_limiter_settings(cfg):
+    # Rate di konfigurasi dalam alert per menit
+    return dict(
+        global_rate=cfg.alert_rate_global / 60,
+        global_burst=cfg.alert_burst_global,
+        host_rate=cfg.alert_rate_host / 60,
+        host_burst=cfg.alert_burst_host,
+        debounce=cfg.device_debounce,
+    )
+
+def send_ip_alert(event):
+    limiter = get_alert_limiter()
+    if not limiter.acquire(event["hostname"]):
+        ALERTS_RATE_LIMITED.inc()
+        print("Alert rate limit reached, unauthorized IP alert suppressed.")
+        return
+    text, html = alert_templates.ip_alert(event, limiter.take_suppressed(event["hostname"]))
+    # Kirim email alert
+    send_email("🚨 Alert: Unauthorized IP Detected", html, save_if_failed=False, text=text)
+
+def send_usb_alert(hostname, events):
+    limiter = get_alert_limiter()
+    if not limiter.acquire(hostname, len(events)):
+        ALERTS_RATE_LIMITED.inc()
+        print(f"Alert rate limit reached, {len(events)} USB events suppressed.")
+        return
+    # Kirim email alert (satu email untuk satu batch)
+    text, html = alert_templates.usb_digest(events, limiter.take_suppressed(hostname))
+    send_email("🔔 Alert: USB Device Connection Detected", html, text=text)
+
+_usb_batcher = None
+
+def get_usb_batcher(loop=None):
+    global _usb_batcher
+    if _usb_batcher is None:
+        _usb_batcher = alert_batch.AlertBatcher(
+            send_usb_alert,
+            max_delay=config.current().alert_batch_delay,
+            max_batch=config.current().alert_batch_size,
+            loop=loop,
+        ).start()
+    return _usb_batcher
+
+def load_config():
+    """Muat environment + .env; dipanggil sekali saat start, bukan saat import.
+
+    TEMP_DIR (utmp, mungkin fork `who`, lookup pwd) baru ditentukan saat spool
+    pertama kali dipakai, setelah monitor udev aktif.
+    """
+    config.load()
+
+# Field yang berlaku tanpa restart; sisanya membentuk struktur yang dibuat sekali saat start
+MAIL_CONFIG_FIELDS = {
+    "email_host", "email_port", "email_user", "email_password", "recipients",
+    "email_fallback_hosts", "smtp_starttls", "smtp_timeout", "syslog_socket",
+    "webhook_url", "webhook_timeout", "delivery_workers",
+}
+HOST_CONFIG_FIELDS = {"ip_policy", "ip_policy_file", "host_info_ttl"}
+LIMIT_CONFIG_FIELDS = {
+    "alert_rate_global", "alert_burst_global", "alert_rate_host", "alert_burst_host", "device_debounce",
+}
+LIVE_CONFIG_FIELDS = MAIL_CONFIG_FIELDS | HOST_CONFIG_FIELDS | LIMIT_CONFIG_FIELDS | {
+    "smtp_keepalive", "alert_batch_delay", "alert_batch_size", "resend_batch_bytes",
+    "resend_backoff_min", "resend_backoff_max",
+}
+
+def apply_config(loop, new, changed):
+    """Terapkan snapshot baru ke objek yang sudah dibuat. Objek yang belum dibuat
+    akan langsung memakai snapshot baru saat pertama kali dipakai."""
+    if _mail_sender is not None:
+        _mail_sender.keepalive = new.smtp_keepalive
+        if changed & MAIL_CONFIG_FIELDS:
+            # Bisa menunggu pengiriman yang sedang berjalan, jadi di executor
+            loop.run_in_executor(None, _mail_sender.replace_delivery, get_delivery())
+    if _host_identity is not None and changed & HOST_CONFIG_FIELDS:
+        _host_identity.configure(new.ip_policy, new.host_info_ttl)
+    if _alert_limiter is not None and changed & LIMIT_CONFIG_FIELDS:
+        _alert_limiter.configure(**alert_limiter_settings(new))
+    if _usb_batcher is not None:
+        _usb_batcher.max_delay = new.alert_batch_delay
+        _usb_batcher.max_batch = new.alert_batch_size
+    if _resend_scheduler is not None:
+        _resend_scheduler.min_delay = new.resend_backoff_min
+        _resend_scheduler.max_delay = new.resend_backoff_max
+
+def reload_config(loop, on_change=None):
+    old = config.current()
+    try:
+        new = config.reload()
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Invalid configuration in {config.env_path()}, keeping previous settings: {e}")
         return
+    changed = config.changed_fields(old, new)
+    if not changed:
+        return
+    print(f"[INFO] Configuration reloaded: {', '.join(sorted(changed))}")
+    apply_config(loop, new, changed)
+    restart = changed - LIVE_CONFIG_FIELDS
+    if restart:
+        print(f"[WARN] Restart required to apply: {', '.join(sorted(restart))}")
+    if on_change is not None:
+        on_change(changed)
+
+class ConfigReloader:
+    """Pantau .env dan IP_POLICY_FILE dengan inotify dan reload konfigurasi saat berubah."""
 
-    combined_body = ""
-    files_to_delete = []
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.watcher = None
+        self.timer = None
 
-    for filename in os.listdir(TEMP_DIR):
-        file_path = os.path.join(TEMP_DIR, filename)
+    def start(self, loop):
+        paths = config.watched_paths()
+        if not paths:
+            return
+        watcher = config.EnvFileWatcher(*paths)
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                body = f.read()
-            combined_body += body + "<br><br>"
-            files_to_delete.append(file_path)
+            watcher.open()
+        except OSError as e:
+            print(f"[WARN] Cannot watch {', '.join(paths)} ({e}), configuration changes need a restart.")
+            return
+        self.watcher = watcher
+        loop.add_reader(watcher.fileno(), self.on_readable, loop)
+
+    def on_readable(self, loop):
+        # Editor sering menulis beberapa kali berturut-turut; reload sekali saja
+        if self.watcher.read_changed() and self.timer is None:
+            self.timer = loop.call_later(0.2, self.reload, loop)
+
+    def reload(self, loop):
+        self.timer = None
+        reload_config(loop, self.on_change)
+        # IP_POLICY_FILE bisa diganti lewat .env: pantau file yang baru
+        if self.watcher is not None and self.watcher.paths != config.watched_paths():
+            self.stop(loop)
+            self.watcher = None
+            self.start(loop)
+
+    def stop(self, loop):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.watcher is not None:
+            loop.remove_reader(self.watcher.fileno())
+            self.watcher.close()
+
+# Filter yang terpasang sebagai BPF di monitor udev; tetap sampai restart supaya
+# allow-list Python tidak menyimpang dari yang disaring kernel
+_udev_event_filter = None
+
+def event_allowed(device):
+    # Set kosong berarti semua action diterima
+    allowed = _udev_event_filter if _udev_event_filter is not None else config.current().udev_event_filter
+    for key in ((device.subsystem, device.device_type), (device.subsystem, None)):
+        actions = allowed.get(key)
+        if actions is not None:
+            return not actions or device.action in actions
+    return False
+
+_sinks = None
+
+def get_sinks(loop=None, forward=True):
+    """Daftar sink event: email (atau collector pusat jika COLLECTOR_ADDR diisi dan
+    ``forward`` True), plus log JSON-lines jika EVENT_LOG_PATH diisi."""
+    global _sinks
+    if _sinks is None:
+        cfg = config.current()
+        if forward and cfg.collector_addr:
+            import collector
+            client = collector.CollectorClient(
+                cfg.collector_addr, socket.gethostname(),
+                max_batch=cfg.collector_batch_size,
+                max_delay=cfg.collector_batch_delay,
+                max_pending=cfg.collector_buffer,
+                secret=cfg.collector_secret,
+            ).start()
+            _sinks = [collector.CollectorSink(client)]
+        else:
+            _sinks = [sinks.EmailSink(get_usb_batcher(loop), send_ip_alert, get_alert_limiter())]
+        if cfg.event_log_path:
+            _sinks.append(sinks.JsonLinesSink(
+                cfg.event_log_path,
+                max_bytes=cfg.event_log_max_bytes,
+                max_age=cfg.event_log_max_age,
+                compress=cfg.event_log_gzip,
+                loop=loop,
+            ))
+    return _sinks
+
+def emit_event(event):
+    for sink in get_sinks():
+        try:
+            sink.emit(event)
         except Exception as e:
-            print(f"Error reading {filename}: {e}")
+            print(f"Error emitting event to {type(sink).__name__}: {e}")
 
-    if not combined_body:
-        print("No failed emails to resend.")
+def close_sinks():
+    for sink in _sinks or ():
+        try:
+            sink.close()
+        except Exception as e:
+            print(f"Error closing {type(sink).__name__}: {e}")
+
+def create_usb_monitor():
+    global _udev_event_filter
+    cfg = config.current()
+    monitor = pyudev.Monitor.from_netlink(get_udev_context())
+    # Filter subsystem/devtype dipasang sebagai BPF di socket netlink, jadi event
+    # lain (usb_interface, dll) dibuang kernel sebelum sampai ke Python
+    _udev_event_filter = cfg.udev_event_filter
+    for subsystem, devtype in _udev_event_filter:
+        monitor.filter_by(subsystem=subsystem, device_type=devtype)
+    if cfg.udev_filter_tag:
+        monitor.filter_by_tag(cfg.udev_filter_tag)
+    set_udev_receive_buffer(monitor, cfg.udev_rcvbuf)
+    return monitor
+
+def set_udev_receive_buffer(monitor, size):
+    # Buffer default (~200 KB) penuh saat docking/hub dengan banyak perangkat.
+    # SO_RCVBUFFORCE butuh CAP_NET_ADMIN; tanpa itu pakai SO_RCVBUF (dibatasi rmem_max)
+    if size <= 0:
+        return
+    try:
+        monitor.set_receive_buffer_size(size)
+    except OSError:
+        sock = socket.socket(fileno=os.dup(monitor.fileno()))
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+            effective = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            print(f"[INFO] udev receive buffer limited to {effective} bytes (no CAP_NET_ADMIN).")
+        except OSError as e:
+            print(f"Failed to enlarge udev receive buffer: {e}")
+        finally:
+            sock.close()
+
+_inventory = None
+
+_inventory_refused = False
+
+def get_inventory():
+    # INVENTORY_DB=off menonaktifkan inventaris (semua perangkat di-alert)
+    global _inventory, _inventory_refused
+    if _inventory is not None or _inventory_refused:
+        return _inventory
+    try:
+        path = config.current().inventory_db or str(state_dir() / "devices.db")
+        if path == "off":
+            return None
+        if not is_private_path(path):
+            # User yang dipantau bisa meng-allow-list perangkatnya sendiri: lebih aman alert semua
+            _inventory_refused = True
+            print(f"[ERROR] Inventory {path} is writable by other users, ignoring it: all devices will be alerted.")
+            return None
+        import inventory
+        _inventory = inventory.Inventory(
+            path,
+            host=socket.gethostname(),
+            default_policy=config.current().inventory_default_policy,
+        )
+    except Exception as e:
+        # STATE_DIR tidak bisa dibuat (bukan root, /var/lib read-only, typo): sama dengan ditolak
+        _inventory_refused = True
+        print(f"[ERROR] Cannot open inventory ({e}): all devices will be alerted.")
+    return _inventory
+
+def should_alert_device(device):
+    device_inventory = get_inventory()
+    if device_inventory is None:
+        return True
+    # Hanya properti udev (sudah ada di event), tanpa baca sysfs
+    return device_inventory.observe(
+        device.get('ID_VENDOR_ID'), device.get('ID_MODEL_ID'), device.get('ID_SERIAL_SHORT')
+    )
+
+_udev_context = None
+
+def get_udev_context():
+    global _udev_context
+    if _udev_context is None:
+        _udev_context = pyudev.Context()
+    return _udev_context
+
+_usb_snapshot = None
+_snapshot_save_pending = False
+
+def get_usb_snapshot():
+    global _usb_snapshot
+    if _usb_snapshot is None:
+        try:
+            path = str(state_dir() / "usb_snapshot.tsv")
+        except OSError as e:
+            print(f"[ERROR] Cannot create state directory ({e}), USB snapshot disabled.")
+            path = None
+        _usb_snapshot = usb_snapshot.UsbSnapshot(path)
+        if path and is_private_path(path):
+            _usb_snapshot.load()
+        else:
+            # Snapshot yang bisa diubah user dapat menyembunyikan perangkat saat start:
+            # jangan dibaca dan jangan ditulis, semua perangkat terpasang dilaporkan
+            if path:
+                print(f"[ERROR] USB snapshot {path} is writable by other users, ignoring it.")
+            _usb_snapshot.path = None
+            _usb_snapshot.loaded = True  # snapshot kosong -> semua perangkat dianggap baru
+    return _usb_snapshot
+
+def save_usb_snapshot():
+    global _snapshot_save_pending
+    _snapshot_save_pending = False
+    if _usb_snapshot is not None and _usb_snapshot.dirty and _usb_snapshot.path:
+        try:
+            _usb_snapshot.save()
+        except Exception as e:
+            print(f"Error saving USB snapshot: {e}")
+
+def schedule_snapshot_save():
+    # Penulisan digabung: paling banyak sekali per detik saat ada perubahan
+    global _snapshot_save_pending
+    if _snapshot_save_pending:
+        return
+    import asyncio
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # Tanpa event loop: disimpan saat shutdown
+    _snapshot_save_pending = True
+    loop.call_later(1.0, save_usb_snapshot)
+
+def sync_usb_snapshot(reason="since last run"):
+    """Laporkan perangkat yang dicolok/dicabut tanpa event udev yang sampai ke agent
+    (agent tidak berjalan, atau event hilang karena buffer udev penuh)."""
+    snapshot = get_usb_snapshot()
+    first_run = not snapshot.loaded
+    added, removed = snapshot.resync(get_udev_context())
+    save_usb_snapshot()
+
+    if first_run:
+        print(f"[INFO] USB snapshot created with {len(snapshot.devices)} devices.")
+        return
+    print(f"[INFO] USB changes {reason}: {len(added)} added, {len(removed)} removed.")
+    for device in added:
+        if device.get('ID_SERIAL_SHORT'):
+            report_usb_device(device, "add")
+    for key, label in removed:
+        report_removed_device(key, label, reason)
+
+_usb_ids = None
+
+def get_usb_ids():
+    # USB_IDS_INDEX=off menonaktifkan resolusi nama dari usb.ids
+    # Index default di STATE_DIR: lokasinya tetap antar boot dan tidak bisa ditulis user
+    # yang sedang login (file ini di-mmap oleh proses root)
+    global _usb_ids
+    if _usb_ids is not None:
+        return _usb_ids
+    index_path = config.current().usb_ids_index
+    if not index_path:
+        try:
+            index_path = str(state_dir() / "usb.ids.idx")
+        except OSError as e:
+            print(f"[ERROR] Cannot create state directory ({e}), usb.ids index disabled.")
+            index_path = "off"
+    if index_path != "off":
+        import usb_ids
+        _usb_ids = usb_ids.UsbIds(index_path, source=config.current().usb_ids_path)
+    return _usb_ids
+
+def warm_usb_ids():
+    try:
+        if not get_usb_ids().open():
+            print("[INFO] usb.ids not found, vendor/product names come from the device only.")
+    except Exception as e:
+        print(f"Error loading usb.ids index: {e}")
+
+def read_attribute(device, name):
+    # Perangkat murah sering tidak punya string descriptor -> atribut tidak ada
+    value = device.attributes.get(name)
+    if value is None:
+        return None
+    return value.decode(errors="replace").strip() or None
+
+def resolve_usb_names(vendor_id, model_id, manufacturer=None, name=None):
+    """Lengkapi nama vendor/produk yang kosong dari usb.ids."""
+    if manufacturer and name:
+        return manufacturer, name
+    resolver = get_usb_ids()
+    if resolver is not None:
+        try:
+            manufacturer = manufacturer or resolver.vendor(vendor_id)
+            name = name or resolver.product(vendor_id, model_id)
+        except Exception as e:
+            print(f"Error resolving USB ID {vendor_id}:{model_id}: {e}")
+    return manufacturer, name
+
+def report_usb_device(device, action):
+    # Cek inventaris dulu: perangkat yang sudah dikenal tidak perlu get_info/SMTP
+    if not should_alert_device(device):
+        DEVICES_SUPPRESSED.inc()
         return
 
-    # Kirim email gabungan
-    success = send_email("🔔 Alert: USB Device Connection Detected", combined_body, save_if_failed=False)
-    if success:
-        # Hapus file-file yang sudah berhasil dikirim
-        for file_path in files_to_delete:
+    vendor_id = device.get('ID_VENDOR_ID') or read_attribute(device, 'idVendor')
+    model_id = device.get('ID_MODEL_ID') or read_attribute(device, 'idProduct')
+    # Urutan: string descriptor perangkat, hwdb udev, lalu index usb.ids
+    manufacturer, name = resolve_usb_names(
+        vendor_id, model_id,
+        read_attribute(device, 'manufacturer') or device.get('ID_VENDOR_FROM_DATABASE'),
+        read_attribute(device, 'product') or device.get('ID_MODEL_FROM_DATABASE'),
+    )
+    waktu = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    user = get_logged_in_user()
+    serial = device.get('ID_SERIAL') or 'No Serial'
+    hostname, ip, mac, ip_is_illegal = get_info()
+    
+    print(f"USB detected at {waktu} by user: {user}")
+    print("Name:", name if name else "Unknown")
+    print("Manufacturer:", manufacturer if manufacturer else "Unknown")
+    print(f"Vendor:Product ID: {vendor_id}:{model_id}")
+    print("Serial:", serial)
+    print("USB Attach Event:", device.subsystem.upper())
+    print(f"OS: {current_os}")
+    print(f"Hostname : {hostname}")
+    print(f"IP Address : {ip}")
+    print(f"MAC Address: {mac}")
+
+    event = {
+        "type": "usb_attach",
+        "action": action,
+        "time": datetime.datetime.now().isoformat(),
+        "waktu": waktu,
+        "user": user,
+        "name": name,
+        "manufacturer": manufacturer,
+        "serial": serial,
+        "vendor_id": vendor_id,
+        "model_id": model_id,
+        "subsystem": device.subsystem.upper(),
+        "hostname": hostname,
+        "ip": ip,
+        "mac": mac,
+        "os": current_os,
+    }
+    emit_event(event)
+
+def report_removed_device(key, label, reason="since last run"):
+    vendor_id, model_id, serial = key
+    manufacturer, name = resolve_usb_names(vendor_id, model_id, *label)
+    waktu = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    hostname, ip, mac, ip_is_illegal = get_info()
+    print(f"USB removed {reason}: {manufacturer} {name} ({serial})")
+    emit_event({
+        "type": "usb_detach",
+        "action": "remove",
+        "time": datetime.datetime.now().isoformat(),
+        "waktu": waktu,
+        "user": get_logged_in_user(),
+        "name": name or f"{vendor_id}:{model_id}",
+        "manufacturer": manufacturer,
+        "serial": serial,
+        "vendor_id": vendor_id,
+        "model_id": model_id,
+        "subsystem": "USB",
+        "hostname": hostname,
+        "ip": ip,
+        "mac": mac,
+        "os": current_os,
+    })
+
+def handle_usb_device(device):
+    try:
+        UDEV_EVENTS_RECEIVED.inc(subsystem=device.subsystem)
+        if not event_allowed(device):
+            UDEV_EVENTS_FILTERED.inc(subsystem=device.subsystem)
+            return
+
+        if device.subsystem == 'net':
+            # Interface baru/hilang/rename: hanya entri interface itu yang dievaluasi ulang
+            if _ip_monitor is not None and _ip_monitor.table is not None:
+                _ip_monitor.on_net_device(device)
+            else:
+                get_host_identity().invalidate()
+        elif device.device_type == 'usb_device':
+            # Snapshot diperbarui supaya restart berikutnya tidak melaporkan ulang;
+            # gagal di sini tidak boleh membuat alert di bawah terlewat
             try:
-                os.remove(file_path)
-                print(f"Deleted {file_path}")
+                if device.action == 'add':
+                    get_usb_snapshot().add(device)
+                elif device.action == 'remove':
+                    get_usb_snapshot().remove(device)
+                if get_usb_snapshot().dirty:
+                    schedule_snapshot_save()
             except Exception as e:
-                print(f"Failed to delete {file_path}: {e}")
-    else:
-        print("Resend failed. Files not deleted.")
-
-def monitor_usb():
-    # print("Starting USB monitoring...")
-    context = pyudev.Context()
-    monitor = pyudev.Monitor.from_netlink(context)
-    monitor.filter_by(subsystem='usb')  # Monitor USB devices
-    monitor.filter_by(subsystem='net')  # Monitor network interfaces 
-
-    for device in iter(monitor.poll, None):
+                print(f"Error updating USB snapshot: {e}")
+
+        if (device.action == 'add' and device.get('ID_SERIAL_SHORT')):
+            report_usb_device(device, device.action)
+
+    except Exception as e:
+        print(f"Error occurred while processing device: {e}")
+
+def drain_usb_monitor(monitor):
+    # Dipanggil loop saat fd udev readable; ambil semua event tanpa blocking
+    overflowed = False
+    while True:
         try:
-            if (device.action == 'add' and device.get('ID_SERIAL_SHORT')):
-                manufacturer = device.attributes.get('manufacturer').decode()
-                name = device.attributes.get('product').decode()
-                vendor_id = device.attributes.get('idVendor')
-                waktu = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                user = get_logged_in_user()
-                serial = device.get('ID_SERIAL') or 'No Serial'
-                hostname, ip, mac, ip_is_illegal = get_info()
-                
-                print(f"USB detected at {waktu} by user: {user}")
-                print("Name:", name if name else "Unknown")
-                print("Manufacturer:", manufacturer if manufacturer else "Unknown")
-                # print("Vendor ID:", vendor_id.decode() if vendor_id else "Unknown")
-                print("Serial:", serial)
-                print("USB Attach Event:", device.subsystem.upper())
-                print(f"OS: {current_os}")
-                print(f"Hostname : {hostname}")
-                print(f"IP Address : {ip}")
-                print(f"MAC Address: {mac}")
-
-                html = f"""
-                <html>
-                <body>
-                    <p>USB detected at <strong>{waktu}</strong> by user: <strong>{user}</strong></p>
-                    <table border="1" cellpadding="6" cellspacing="0" style="border-collapse: collapse; font-family: Arial, sans-serif; font-size: 14px;">
-                    <tr style="background-color: #f2f2f2;">
-                        <th align="left">Field</th>
-                        <th align="left">Value</th>
-                    </tr>
-                    <tr><td>Name</td><td>{name}</td></tr>
-                    <tr><td>Manufacturer</td><td>{manufacturer}</td></tr>
-                    <tr><td>Serial</td><td>{serial}</td></tr>
-                    <tr><td>USB Attach Event</td><td>{device.subsystem.upper()}</td></tr>
-                    <tr><td>Hostname</td><td>{hostname}</td></tr>
-                    <tr><td>IP Address</td><td>{ip}</td></tr>
-                    <tr><td>MAC Address</td><td>{mac}</td></tr>
-                    <tr><td>OS</td><td>{current_os}</td></tr>
-                    </table>
-                </body>
-                </html>
-                """
-
-                # Kirim email alert
-                send_email("🔔 Alert: USB Device Connection Detected", html)
+            device = monitor.poll(timeout=0)
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:
+                print(f"Error receiving udev event: {e}")
+                break
+            # Kernel membuang event; event yang masih di buffer tetap valid
+            overflowed = True
+            continue
+        if device is None:
+            break
+        handle_usb_device(device)
 
+    if overflowed:
+        UDEV_OVERFLOWS.inc()
+        print("[WARN] udev receive buffer overflowed, events were lost. Resyncing USB devices.")
+        # Event net ikut hilang, jadi tabel interface dan identitas host juga dihitung ulang
+        if _ip_monitor is not None and _ip_monitor.table is not None:
+            _ip_monitor.resync()
+        else:
+            get_host_identity().invalidate()
+        try:
+            sync_usb_snapshot("after udev overflow")
         except Exception as e:
-            print(f"Error occurred while processing device: {e}")
+            print(f"Error resyncing USB devices: {e}")
 
-def schedule_runner():
-    schedule.every(5).minutes.do(resend_failed_emails)
+_resend_scheduler = None
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+def start_resend_scheduler(loop):
+    # Tidak ada timer selama spool kosong; backoff per host dengan jitter supaya
+    # host-host tidak membanjiri relay bersamaan setelah gangguan
+    global _resend_scheduler
+    import retry
 
-if __name__ == "__main__":
-    # Jalankan scheduler di thread terpisah
-    threading.Thread(target=schedule_runner, daemon=True).start()
-    # Jalankan pemantauan IP dalam thread
-    threading.Thread(target=ip_monitor_loop, daemon=True).start()
-    monitor_usb()
+    import_legacy_failed_emails()
+    _resend_scheduler = retry.RetryScheduler(
+        loop,
+        pending=lambda: get_failed_spool().pending_bytes() > 0,
+        probe=lambda: get_mail_sender().delivery.probe(),
+        drain=resend_failed_emails,
+        min_delay=config.current().resend_backoff_min,
+        max_delay=config.current().resend_backoff_max,
+    ).start()
+    return _resend_scheduler
 
-    # Simpan script tetap berjalan
-    while True:
-        time.sleep(1)
+def schedule_metrics_textfile(loop, path, interval):
+    def write():
+        try:
+            metrics.REGISTRY.write_textfile(path)
+        except Exception as e:
+            print(f"Error writing metrics textfile: {e}")
+        loop.call_later(interval, write)
+
+    write()
+
+def start_metrics(loop):
+    # METRICS_ADDR=127.0.0.1:9464 -> endpoint HTTP /metrics
+    # METRICS_TEXTFILE=/var/lib/node_exporter/usbnotify.prom -> textfile collector
+    server = None
+    cfg = config.current()
+    address = cfg.metrics_addr
+    if address:
+        try:
+            server = metrics.start_http_server(address)
+            print(f"[INFO] Metrics endpoint on http://{address}/metrics")
+        except Exception as e:
+            print(f"Failed to start metrics endpoint: {e}")
+    textfile = cfg.metrics_textfile
+    if textfile:
+        schedule_metrics_textfile(loop, textfile, cfg.metrics_textfile_interval)
+    return server
+
+async def run_agent(monitor=None):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    if monitor is None:
+        monitor = create_usb_monitor()
+        monitor.start()
+    get_sinks(loop)
+    loop.add_reader(monitor.fileno(), drain_usb_monitor, monitor)
+
+    # Index usb.ids dibangun/di-mmap di background sebelum sync snapshot; lookup yang
+    # datang selama build menunggu build yang sama, tidak membangun ulang
+    if get_usb_ids() is not None:
+        loop.run_in_executor(None, warm_usb_ids)
+
+    # Monitor sudah aktif, jadi perangkat yang dicolok sejak titik ini tidak terlewat
+    try:
+        sync_usb_snapshot()
+    except Exception as e:
+        print(f"Error comparing USB snapshot: {e}")
+
+    ip_monitor = get_ip_monitor()
+    ip_monitor.start(loop)
+
+    def on_config_change(changed):
+        if changed & HOST_CONFIG_FIELDS:
+            ip_monitor.recheck()
+
+    config_reloader = ConfigReloader(on_config_change)
+    config_reloader.start(loop)
+
+    resend_scheduler = start_resend_scheduler(loop)
+
+    # Spool dibuka sekarang supaya gauge kedalaman spool langsung terdaftar
+    get_failed_spool()
+    metrics_server = start_metrics(loop)
+
+    await stop.wait()
+    print("[INFO] Shutting down, draining pending alerts...")
+
+    loop.remove_reader(monitor.fileno())
+    ip_monitor.stop(loop)
+    config_reloader.stop(loop)
+    resend_scheduler.cancel()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+    save_usb_snapshot()
+    if _inventory is not None:
+        _inventory.close()
+    await shutdown_alerting(loop)
+
+async def shutdown_alerting(loop):
+    # Kirim batch yang tertunda, tunggu antrean SMTP kosong, lalu sinkronkan spool
+    await loop.run_in_executor(None, close_sinks)
+    if _mail_sender is not None:
+        await loop.run_in_executor(None, _mail_sender.stop, 30)
+    if _failed_spool is not None:
+        _failed_spool.close()
+
+def main():
+    load_config()
+    # Monitor udev dipasang paling awal supaya tidak ada event yang terlewat;
+    # event yang datang selama inisialisasi sisanya tertahan di buffer socket
+    monitor = create_usb_monitor()
+    monitor.start()
+
+    import asyncio
+    asyncio.run(run_agent(monitor))
+
+if __name__ == "__main__":
+    main()
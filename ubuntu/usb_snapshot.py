@@ -0,0 +1,89 @@
+# Built-in modules
+import os
+
+
+def device_key(device):
+    """Identitas perangkat yang stabil antar restart: vendor, model, serial.
+
+    Perangkat tanpa serial memakai nama port (mis. ``1-2``) sebagai gantinya.
+    Semua nilai berasal dari properti udev, bukan atribut sysfs.
+    """
+    serial = device.get('ID_SERIAL_SHORT') or f"@{device.sys_name}"
+    return (device.get('ID_VENDOR_ID') or "", device.get('ID_MODEL_ID') or "", serial)
+
+
+def device_label(device):
+    return (device.get('ID_VENDOR') or "", device.get('ID_MODEL') or "")
+
+
+def iter_usb_devices(context):
+    """Enumerasi perangkat USB yang terpasang (hanya usb_device, bukan interface)."""
+    for device in context.list_devices(subsystem='usb', DEVTYPE='usb_device'):
+        yield device_key(device), device
+
+
+class UsbSnapshot:
+    """Daftar perangkat USB terpasang yang disimpan di file teks ringkas.
+
+    Satu baris per perangkat: ``vendor_id<TAB>model_id<TAB>serial<TAB>vendor<TAB>model``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.devices = {}  # key -> (vendor, model)
+        self.loaded = False
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) == 5:
+                        self.devices[tuple(fields[:3])] = tuple(fields[3:])
+            self.loaded = True
+        except FileNotFoundError:
+            self.loaded = False
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for key, label in self.devices.items():
+                f.write("\t".join(key + label) + "\n")
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def add(self, device):
+        key = device_key(device)
+        if key not in self.devices:
+            self.devices[key] = device_label(device)
+            self.dirty = True
+
+    def remove(self, device):
+        if self.devices.pop(device_key(device), None) is not None:
+            self.dirty = True
+
+    def resync(self, context):
+        """Bandingkan dengan perangkat yang terpasang sekarang.
+
+        Return ``(added_devices, removed)``: daftar objek device yang baru, dan
+        daftar ``(key, label)`` yang sudah tidak ada. Snapshot diperbarui.
+        """
+        previous = self.devices
+        current = {}
+        added = []
+        for key, device in iter_usb_devices(context):
+            if key in previous:
+                current[key] = previous[key]
+            else:
+                # Hanya perangkat baru yang dibaca lebih lanjut
+                current[key] = device_label(device)
+                added.append(device)
+        removed = [(key, label) for key, label in previous.items() if key not in current]
+
+        self.dirty = bool(added or removed) or not self.loaded
+        self.devices = current
+        self.loaded = True
+        return added, removed
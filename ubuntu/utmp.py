@@ -0,0 +1,67 @@
+# Built-in modules
+import os
+import struct
+import threading
+from collections import namedtuple
+
+UTMP_PATH = "/var/run/utmp"
+
+# struct utmp (glibc, Linux x86_64/aarch64), 384 byte per record:
+# ut_type, pad, ut_pid, ut_line, ut_id, ut_user, ut_host, ut_exit,
+# ut_session, ut_tv (sec, usec), ut_addr_v6, __unused
+UTMP_RECORD = struct.Struct("=hxxi32s4s32s256shhiii16s20x")
+USER_PROCESS = 7
+
+Session = namedtuple("Session", "user line host login_time pid")
+
+
+def _cstr(raw):
+    return raw.split(b"\0", 1)[0].decode(errors="replace")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_sessions(path=UTMP_PATH):
+    """Baca semua sesi login aktif langsung dari file utmp (tanpa subprocess)."""
+    sessions = []
+    with open(path, "rb") as f:
+        data = f.read()
+
+    for offset in range(0, len(data) - UTMP_RECORD.size + 1, UTMP_RECORD.size):
+        (ut_type, pid, line, _id, user, host,
+         _term, _exit, _session, tv_sec, _tv_usec, _addr) = UTMP_RECORD.unpack_from(data, offset)
+        if ut_type != USER_PROCESS or not user.strip(b"\0"):
+            continue
+        if not _pid_alive(pid):
+            continue  # Record basi (sesi sudah berakhir tapi tidak dibersihkan)
+        sessions.append(Session(_cstr(user), _cstr(line), _cstr(host), tv_sec, pid))
+    return sessions
+
+
+class SessionCache:
+    """Hasil ``read_sessions`` yang disimpan sampai mtime/ukuran utmp berubah."""
+
+    def __init__(self, path=UTMP_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.sessions = []
+
+    def get(self):
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if stamp == self.stamp:
+            return self.sessions
+        with self.lock:
+            if stamp != self.stamp:
+                self.sessions = read_sessions(self.path)
+                self.stamp = stamp
+            return self.sessions
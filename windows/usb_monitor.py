@@ -3,6 +3,7 @@ import datetime
 import getpass
 import os
 import platform
+import random
 import socket
 import subprocess
 import threading
@@ -16,7 +17,6 @@ import wmi
 
 # Third-party modules
 import psutil
-import schedule
 import smtplib
 from dotenv import load_dotenv
 
@@ -189,34 +189,50 @@ def save_failed_email(body):
         with open(filename, "w", encoding="utf-8") as f:
             f.write(body)
         print(f"Failed email content saved to: {filename}")
+        # Bangunkan retry_runner (tidak ada timer selama tidak ada email gagal)
+        spool_event.set()
     except Exception as e:
         print(f"Error saving failed email: {e}")
 
-# gabung body jadi satu email
-def resend_failed_emails():
+def pending_failed_emails():
     if not os.path.exists(TEMP_DIR):
-        return
+        return []
+    return sorted(
+        os.path.join(TEMP_DIR, filename)
+        for filename in os.listdir(TEMP_DIR) if filename.startswith("email_")
+    )
 
-    combined_body = ""
-    files_to_delete = []
+# Gabung body jadi email berukuran terbatas; return True jika semua terkirim
+def resend_failed_emails():
+    max_bytes = int(os.getenv("RESEND_BATCH_BYTES", str(256 * 1024)))
+    files = pending_failed_emails()
+    if not files:
+        print("No failed emails to resend.")
+        return True
 
-    for filename in os.listdir(TEMP_DIR):
-        file_path = os.path.join(TEMP_DIR, filename)
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                body = f.read()
-            combined_body += body + "<br><br>"
+    while files:
+        bodies = []
+        files_to_delete = []
+        size = 0
+        while files and (not bodies or size < max_bytes):
+            file_path = files.pop(0)
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    body = f.read()
+            except Exception as e:
+                print(f"Error reading {file_path}: {e}")
+                continue
+            bodies.append(body)
             files_to_delete.append(file_path)
-        except Exception as e:
-            print(f"Error reading {filename}: {e}")
-
-    if not combined_body:
-        print("No failed emails to resend.")
-        return
+            size += len(body)
 
-    # Kirim email gabungan
-    success = send_email("🚨 Alert: Unauthorized IP Detected", combined_body, save_if_failed=False)
-    if success:
+        if not bodies:
+            break
+        # Kirim email gabungan
+        success = send_email("🚨 Alert: Unauthorized IP Detected", "<br><br>".join(bodies), save_if_failed=False)
+        if not success:
+            print("Resend failed. Files not deleted.")
+            return False
         # Hapus file-file yang sudah berhasil dikirim
         for file_path in files_to_delete:
             try:
@@ -224,8 +240,51 @@ def resend_failed_emails():
                 print(f"Deleted {file_path}")
             except Exception as e:
                 print(f"Failed to delete {file_path}: {e}")
-    else:
-        print("Resend failed. Files not deleted.")
+    return True
+
+def probe_mail_relay():
+    # Cek murah sebelum mengirim ulang: banner + EHLO, tanpa STARTTLS/login
+    try:
+        server = smtplib.SMTP(os.getenv("EMAIL_HOST"), os.getenv("EMAIL_PORT"), timeout=10)
+    except Exception:
+        return False
+    try:
+        server.ehlo()
+        return True
+    except Exception:
+        return False
+    finally:
+        server.close()
+
+spool_event = threading.Event()
+
+def retry_runner():
+    # Hanya bangun jika ada email gagal. Jeda ke-n = min * 2**n (maks. max),
+    # diacak antara setengah dan penuh supaya host tidak mencoba ulang bersamaan.
+    min_delay = float(os.getenv("RESEND_BACKOFF_MIN", "30"))
+    max_delay = float(os.getenv("RESEND_BACKOFF_MAX", "3600"))
+    failures = 0
+    if pending_failed_emails():
+        spool_event.set()
+
+    while True:
+        spool_event.wait()
+        delay = min(max_delay, min_delay * (2 ** failures))
+        time.sleep(random.uniform(delay / 2, delay))
+        spool_event.clear()
+
+        try:
+            ok = probe_mail_relay() and resend_failed_emails()
+        except Exception as e:
+            print(f"Error resending failed emails: {e}")
+            ok = False
+        if ok:
+            failures = 0
+        else:
+            print("Mail relay unreachable or resend failed, backing off.")
+            failures += 1
+        if pending_failed_emails():
+            spool_event.set()
 
 def win_monitor_usb():
     c = wmi.WMI()
@@ -292,13 +351,6 @@ def win_monitor_usb():
             print("User interrupted with Ctrl+C")
             break
 
-def schedule_runner():
-    schedule.every(1).hours.do(resend_failed_emails)
-
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
-
 class USBWatcherService(win32serviceutil.ServiceFramework):
     _svc_name_ = "USBWatcher"
     _svc_display_name_ = "USB Watcher Python Service"
@@ -314,7 +366,7 @@ class USBWatcherService(win32serviceutil.ServiceFramework):
     def SvcDoRun(self):
         servicemanager.LogInfoMsg("USB Watcher Service started.")
 
-        threading.Thread(target=schedule_runner, daemon=True).start()
+        threading.Thread(target=retry_runner, daemon=True).start()
         threading.Thread(target=ip_monitor_loop, daemon=True).start()
         win_monitor_usb()
 